@@ -0,0 +1,105 @@
+"""
+Run hot paths benchmarks and compare them with the baseline.
+
+    python -m benchmarks --save-baseline   # record the baseline (e.g. on the main branch)
+    python -m benchmarks                   # fails if a benchmark is 25% slower than the baseline
+    python -m benchmarks --filter webhooks --threshold 0.1
+
+Baseline numbers depend on the machine, so the baseline is not committed
+(benchmarks/baseline.json is ignored by git): record it on the machine (CI runner)
+which runs the comparison, before the change.
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+import redis  # noqa: E402
+from django.db import OperationalError, connection  # noqa: E402
+
+from shared.cache import CacheService  # noqa: E402
+
+from . import hot_paths  # noqa: E402, F401 - registers benchmarks
+from .core import BENCHMARKS, CLEANUPS, load_baseline, measure, regressions, save_baseline  # noqa: E402
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+
+def available_services() -> set[str]:
+    services = set()
+
+    try:
+        connection.ensure_connection()
+    except OperationalError as error:
+        print(f"Database benchmarks are skipped: {error}".strip())
+    else:
+        services.add("database")
+
+    try:
+        CacheService().connection.ping()
+    except redis.RedisError as error:
+        print(f"Cache benchmarks are skipped: {error}")
+    else:
+        services.add("cache")
+
+    return services
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot paths benchmarks")
+    parser.add_argument("--filter", default="", help="run benchmarks with the substring in the name")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCHMARK_THRESHOLD", default="0.25")))
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", "--save", action="store_true", help="save results as the baseline")
+    args = parser.parse_args()
+
+    services = available_services()
+    selected = [bench for name, bench in BENCHMARKS.items() if args.filter in name]
+
+    old_database_name = None
+    if "database" in services and any("database" in bench.requires for bench in selected):
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    results: dict[str, float] = {}
+    try:
+        for bench in selected:
+            missing = set(bench.requires) - services
+            if missing:
+                print(f"{bench.name:<40}skipped: no {', '.join(sorted(missing))}")
+                continue
+            results[bench.name] = measure(bench)
+    finally:
+        for func, requires in CLEANUPS:
+            if set(requires) <= services:
+                func()
+        if old_database_name is not None:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+    baseline = load_baseline(args.baseline)
+    if not baseline and not args.save_baseline:
+        print(f"No baseline in {args.baseline}, nothing to compare with: record it with --save-baseline")
+    slower = regressions(results, baseline, args.threshold)
+
+    print(f"{'benchmark':<40}{'us/call':>12}{'baseline':>12}{'change':>10}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        change = f"{(value / base - 1) * 100:+.1f}%" if base else "new"
+        mark = " ❌" if name in slower else ""
+        print(f"{name:<40}{value:>12.2f}{base or float('nan'):>12.2f}{change:>10}{mark}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline is saved to {args.baseline}")
+    elif slower:
+        print(f"{len(slower)} benchmark(s) are more than {args.threshold:.0%} slower than the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Cache codecs micro-benchmark over TrackingOrder-shaped payloads.
+
+    python -m benchmarks.cache_codecs
+
+Codecs with missing packages (orjson, msgpack) are skipped.
+"""
+
+import random
+import timeit
+import uuid
+
+from shared.codecs import CODECS, decode, get_codec
+
+NUMBER = 20_000
+
+
+def tracking_order(restaurants: int, cooked: bool = False) -> dict:
+    """Same shape as asdict(TrackingOrder)."""
+
+    return {
+        "restaurants": {
+            str(restaurant_id): {
+                "external_id": str(uuid.uuid4()),
+                "status": "cooked" if cooked else "cooking",
+            }
+            for restaurant_id in range(1, restaurants + 1)
+        },
+        "delivery": {
+            "status": "delivery",
+            "location": [str(random.random()), str(random.random())],
+        },
+    }
+
+
+PAYLOADS: dict[str, dict] = {
+    "new order (2 restaurants)": tracking_order(2),
+    "uber location ping (2 restaurants)": tracking_order(2, cooked=True),
+    "big order (20 restaurants)": tracking_order(20, cooked=True),
+}
+
+
+def run(codec_name: str, payload: dict, compress_min_size: int = 0) -> tuple[float, float, int]:
+    codec = get_codec(codec_name, compress_min_size=compress_min_size)
+    encoded = codec.encode(payload)
+    assert decode(encoded) == payload
+
+    encode_time = timeit.timeit(lambda: codec.encode(payload), number=NUMBER)
+    decode_time = timeit.timeit(lambda: decode(encoded), number=NUMBER)
+
+    # microseconds per operation
+    return encode_time / NUMBER * 1e6, decode_time / NUMBER * 1e6, len(encoded)
+
+
+def main():
+    print(f"{'payload':<38}{'codec':<16}{'encode, us':>12}{'decode, us':>12}{'size, B':>10}")
+
+    for payload_name, payload in PAYLOADS.items():
+        for codec_name in CODECS:
+            for compress_min_size in (0, 256):
+                label = codec_name if not compress_min_size else f"{codec_name}+zlib"
+                if compress_min_size and codec_name == "json":
+                    continue  # legacy format is never compressed
+                try:
+                    encode_us, decode_us, size = run(codec_name, payload, compress_min_size)
+                except RuntimeError as error:
+                    print(f"{payload_name:<38}{label:<16}skipped: {error}")
+                    break
+                print(f"{payload_name:<38}{label:<16}{encode_us:>12.2f}{decode_us:>12.2f}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmarks registry, runner and baseline comparison.
+
+A benchmark is a setup function returning the callable to measure
+(setup is not measured):
+
+    @benchmark("filters.food_filters")
+    def food_filters():
+        return lambda: FoodFilters(deliveryProvider="uber")
+
+Benchmarks which require Postgres or Redis are skipped if they are not available.
+"""
+
+import contextlib
+import io
+import json
+import timeit
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+REPEAT = 5
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    requires: tuple[str, ...] = ()
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+CLEANUPS: list[tuple[Callable[[], None], tuple[str, ...]]] = []
+
+
+def benchmark(name: str, requires: tuple[str, ...] = ()):
+    """Register the setup function. `requires`: "database", "cache"."""
+
+    def decorator(setup):
+        BENCHMARKS[name] = Benchmark(name=name, setup=setup, requires=requires)
+        return setup
+
+    return decorator
+
+
+def cleanup(requires: tuple[str, ...] = ()):
+    """Register the function to be called after all benchmarks (e.g. to remove cache keys)."""
+
+    def decorator(func):
+        CLEANUPS.append((func, requires))
+        return func
+
+    return decorator
+
+
+def measure(bench: Benchmark) -> float:
+    """Return the best of REPEAT runs, microseconds per call."""
+
+    # prints of the measured code (e.g. "Duplicated webhook") would dominate the output
+    with contextlib.redirect_stdout(io.StringIO()):
+        func = bench.setup()
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=REPEAT, number=number))
+
+    return best / number * 1e6
+
+
+def load_baseline(path: Path) -> dict[str, float]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, results: dict[str, float]):
+    # keep baselines of benchmarks which were skipped in this run
+    baseline = load_baseline(path) | {name: round(value, 3) for name, value in results.items()}
+    path.write_text(json.dumps(dict(sorted(baseline.items())), indent=4) + "\n")
+
+
+def regressions(results: dict[str, float], baseline: dict[str, float], threshold: float) -> dict[str, float]:
+    """Return relative slowdowns above the threshold (0.25 - 25% slower)."""
+
+    slowdowns = {name: value / baseline[name] - 1 for name, value in results.items() if baseline.get(name)}
+    return {name: slowdown for name, slowdown in slowdowns.items() if slowdown > threshold}
@@ -0,0 +1,189 @@
+"""
+Hot paths of food, users and shared.
+
+Database benchmarks run in the test database (created and dropped by the runner),
+cache benchmarks use the DJANGO_CACHE_URL Redis, so point it to a spare database:
+
+    DJANGO_CACHE_URL=redis://localhost:6379/15 python -m benchmarks
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import date, timedelta
+from functools import partial
+from itertools import count
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+from food.enums import OrderStatus
+from food.models import Dish, Order, OrderItem, Restaurant
+from food.tracking import TrackingOrder, TrackingStore
+from food.views import FoodFilters, OrderSerializer
+from food.webhooks import WebhookEvent, accept_webhook, process_webhook_event
+from shared.cache import CacheService
+from shared.codecs import decode, get_codec
+from users.hashers import hash_password
+from users.models import User
+from users.views import UserSerializer
+
+from .cache_codecs import tracking_order
+from .core import benchmark, cleanup
+
+ORDER_ID = 999_999_999  # cache keys of benchmarks don't intersect with real orders
+EXTERNAL_ID = "benchmark-delivery"
+
+
+@benchmark("cache.set_get", requires=("cache",))
+def cache_set_get():
+    cache = CacheService()
+    payload = tracking_order(2)
+
+    def run():
+        cache.set(namespace="orders", key=str(ORDER_ID), value=payload, ttl=60)
+        cache.get(namespace="orders", key=str(ORDER_ID))
+
+    return run
+
+
+@benchmark("cache.get_many[100]", requires=("cache",))
+def cache_get_many():
+    cache = CacheService()
+    keys = [str(ORDER_ID - index) for index in range(100)]
+    for key in keys:
+        cache.set(namespace="orders", key=key, value=tracking_order(2), ttl=60)
+
+    return lambda: cache.get_many(namespace="orders", keys=keys)
+
+
+@benchmark("tracking.serialize")
+def tracking_serialize():
+    codec = get_codec("json")
+    order = TrackingOrder(**tracking_order(2))
+
+    return lambda: codec.encode(asdict(order))
+
+
+@benchmark("tracking.deserialize")
+def tracking_deserialize():
+    payload = get_codec("json").encode(tracking_order(2))
+
+    return lambda: TrackingOrder(**decode(payload))
+
+
+def _dishes(restaurants: int = 2, per_restaurant: int = 50) -> list[Dish]:
+    dishes = []
+    for number in range(restaurants):
+        restaurant = Restaurant.objects.create(name=f"Benchmark {number}", address="Benchmark street")
+        dishes += Dish.objects.bulk_create(
+            Dish(name=f"Dish {index}", price=100 + index, restaurant=restaurant) for index in range(per_restaurant)
+        )
+    return dishes
+
+
+def _serializer_validation(size: int):
+    dishes = _dishes()
+    data = {
+        "items": [{"dish": dishes[index % len(dishes)].pk, "quantity": 1} for index in range(size)],
+        "eta": str(date.today() + timedelta(days=1)),
+        "delivery_provider": "uber",
+    }
+
+    return lambda: OrderSerializer(data=data).is_valid(raise_exception=True)
+
+
+benchmark("orders.serializer_validation[10]", requires=("database",))(partial(_serializer_validation, 10))
+benchmark("orders.serializer_validation[100]", requires=("database",))(partial(_serializer_validation, 100))
+
+
+@benchmark("orders.items_by_restaurant[20]", requires=("database",))
+def items_by_restaurant():
+    dishes = _dishes()
+    user = User.objects.create(email="benchmark@catering.local", phone_number="0000000001")
+    order = Order.objects.create(
+        status=OrderStatus.NOT_STARTED,
+        user=user,
+        delivery_provider="uber",
+        eta=date.today() + timedelta(days=1),
+        total=1,
+    )
+    OrderItem.objects.bulk_create(OrderItem(order=order, dish=dishes[index * 5], quantity=1) for index in range(20))
+
+    return lambda: [list(items) for items in order.items_by_restaurant().values()]
+
+
+@benchmark("filters.food_filters")
+def food_filters():
+    return lambda: FoodFilters(deliveryProvider="uber", limit="10", offset="0")
+
+
+@benchmark("webhooks.uber_location_ping", requires=("cache", "database"))
+def uber_location_ping():
+    # the event status is checked against Order.status
+    user = User.objects.create(email="benchmark-uber@catering.local", phone_number="0000000002")
+    Order.objects.create(
+        id=ORDER_ID,
+        status=OrderStatus.DELIVERY,
+        user=user,
+        delivery_provider="uber",
+        eta=date.today() + timedelta(days=1),
+        total=1,
+    )
+    cache = CacheService()
+    cache.set_external_id("uber", EXTERNAL_ID, ORDER_ID, ttl=60)
+    TrackingStore().save(ORDER_ID, TrackingOrder(**tracking_order(2, cooked=True)), ttl=60)
+
+    # status is not changed: cache only path, the most frequent webhook
+    payload = asdict(WebhookEvent(provider="uber", external_id=EXTERNAL_ID, status="delivery", location=["0.1", "0.2"]))
+
+    return lambda: process_webhook_event(payload)
+
+
+@benchmark("webhooks.accept_duplicate", requires=("cache",))
+def accept_duplicate():
+    event = WebhookEvent(provider="uber", external_id=EXTERNAL_ID, status="delivery", sequence="benchmark")
+    CacheService().add(namespace="webhooks", key=event.deduplication_key, value={"status": event.status}, ttl=60)
+    loop = asyncio.new_event_loop()
+
+    return lambda: loop.run_until_complete(accept_webhook(event))
+
+
+# hashers have different baselines: DJANGO_PASSWORD_HASHER=argon2 python -m benchmarks --filter users.
+@benchmark(f"users.make_password[{settings.PASSWORD_HASHER}]")
+def users_make_password():
+    return lambda: make_password("benchmark-password")
+
+
+@benchmark(f"users.hash_password_pool[{settings.PASSWORD_HASHER}x8]")
+def users_hash_password_pool():
+    # 8 concurrent registrations of one web process: the pool time is the throughput limit
+    clients = ThreadPoolExecutor(max_workers=8)
+
+    return lambda: list(clients.map(hash_password, ["benchmark-password"] * 8))
+
+
+@benchmark(f"users.registration[{settings.PASSWORD_HASHER}]", requires=("database",))
+def users_registration():
+    numbers = count()
+
+    def run():
+        number = next(numbers)
+        data = {
+            "email": f"benchmark-{number}@catering.local",
+            "phone_number": f"9{number:09}",
+            "first_name": "Benchmark",
+            "last_name": "User",
+            "password": "benchmark-password",
+        }
+        serializer = UserSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    return run
+
+
+@cleanup(requires=("cache",))
+def remove_from_tracking_flush():
+    # benchmark keys expire by themselves, but the order must not be flushed to the database
+    CacheService().remove_members("tracking", "dirty", str(ORDER_ID))
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# persistent connections leak in the executor threads of sync views, see DJANGO_DB_POOL in settings
+os.environ.setdefault("DJANGO_DB_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -1,6 +1,10 @@
 import os
 
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+from django.db import close_old_connections
+
+import shared.task_metrics  # noqa: F401 - connects tasks instrumentation signals
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
@@ -9,3 +13,15 @@ app = Celery("config")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 #app.conf.update(task_serializer="pickle") - alternative way to set celery settings
 app.autodiscover_tasks()
+
+
+@task_prerun.connect
+@task_postrun.connect
+def close_obsolete_connections(task=None, **kwargs):
+    """Same as Django does around HTTP requests: reuse the worker thread connection
+    across tasks until CONN_MAX_AGE, drop it if it is broken.
+    """
+
+    # eager task runs inside the caller transaction
+    if not task.request.is_eager:
+        close_old_connections()
@@ -51,10 +51,13 @@ INSTALLED_APPS = [
     # local apps
     "users",
     "food",
+    "shared",
 ]
 
 MIDDLEWARE = [
+    "shared.profiling.ProfilingMiddleware",  # first: measures the whole request; disabled unless DJANGO_PROFILING
     "django.middleware.security.SecurityMiddleware",
+    "shared.db.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -94,10 +97,63 @@ DATABASES = {
         "PASSWORD": os.getenv("DJANGO_DB_PASSWORD", default="postgres"),
         "HOST": os.getenv("DJANGO_DB_HOST", default="database"),
         "PORT": os.getenv("DJANGO_DB_PORT", default="5432"),
-        "ATOMIC_REQUESTS": True,  # use it always, other way is to use decorator @transaction.atomic for action, OR using with transaction.atomic
+        # transactions are opened only around the writes (transaction.atomic in views and services),
+        # so reads and Celery publishing don't hold locks; tasks are published on commit (shared/outbox.py)
+        "ATOMIC_REQUESTS": False,
     }
 }
 
+# Connections reuse. DJANGO_DB_POOL:
+#   persistent - (default) the connection is kept by the thread for CONN_MAX_AGE seconds;
+#                Celery workers reuse it across tasks too (see config/celery.py).
+#                Not under ASGI: sync code runs in the executor threads, and a connection
+#                opened there is not closed after the request - config/asgi.py sets
+#                DJANGO_DB_CONN_MAX_AGE=0 unless it is set explicitly
+#   pgbouncer  - DJANGO_DB_HOST/PORT point to PgBouncer in the transaction pooling mode
+#   psycopg    - pool in the process (psycopg[pool] from the Pipfile: Django uses psycopg 3 if installed);
+#                for ASGI, where threads don't keep connections between requests
+# Per process limit: threads pool of a worker holds up to --concurrency connections,
+# so keep (web processes + worker threads) below Postgres max_connections or use a pool.
+DB_POOL = os.getenv("DJANGO_DB_POOL", default="persistent")
+
+match DB_POOL:
+    case "persistent":
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DJANGO_DB_CONN_MAX_AGE", default="60"))
+        DATABASES["default"]["CONN_HEALTH_CHECKS"] = True  # reused connection is checked before the request
+    case "pgbouncer":
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DJANGO_DB_CONN_MAX_AGE", default="60"))
+        DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+        # named cursors (QuerySet.iterator) don't survive between transactions in PgBouncer
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+    case "psycopg":
+        # CONN_MAX_AGE must stay 0: connections are returned to the pool after every request
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("DJANGO_DB_POOL_MIN_SIZE", default="2")),
+                "max_size": int(os.getenv("DJANGO_DB_POOL_MAX_SIZE", default="10")),
+                "timeout": float(os.getenv("DJANGO_DB_POOL_TIMEOUT", default="10")),  # waiting for a free connection
+            },
+        }
+    case _:
+        raise ValueError(f"DJANGO_DB_POOL={DB_POOL} is not supported. Available: persistent, pgbouncer, psycopg")
+
+# Read replicas: DJANGO_DB_REPLICA_HOSTS=replica-1,replica-2:5433 (same credentials as the primary).
+# Safe requests read from them, see shared/db.py
+DATABASE_REPLICAS: list[str] = []
+for number, replica in enumerate(filter(None, os.getenv("DJANGO_DB_REPLICA_HOSTS", default="").split(",")), start=1):
+    replica_host, _, replica_port = replica.strip().partition(":")
+    DATABASES[f"replica_{number}"] = DATABASES["default"] | {
+        "HOST": replica_host,
+        "PORT": replica_port or DATABASES["default"]["PORT"],
+        "ATOMIC_REQUESTS": False,  # reads don't need transactions
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["shared.db.ReplicaRouter"]
+# seconds to read from the primary after the client's write: more than the replication lag
+REPLICA_STICKINESS_TIME = int(os.getenv("DJANGO_DB_REPLICA_STICKINESS_TIME", default="5"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,6 +173,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# the selected hasher makes new hashes, the others only verify existing ones (see users/hashers.py)
+PASSWORD_HASHER = os.getenv("DJANGO_PASSWORD_HASHER", default="pbkdf2")
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv("DJANGO_PASSWORD_PBKDF2_ITERATIONS", default="1000000"))
+PASSWORD_HASHING_WORKERS = int(os.getenv("DJANGO_PASSWORD_HASHING_WORKERS", default="2"))  # concurrent hashes per process
+
+_password_hashers = {
+    "pbkdf2": "users.hashers.PBKDF2PasswordHasher",
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "bcrypt": "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+}
+if PASSWORD_HASHER not in _password_hashers:
+    raise ValueError(f"DJANGO_PASSWORD_HASHER={PASSWORD_HASHER} is not supported. Available: {', '.join(_password_hashers)}")
+
+PASSWORD_HASHERS = [_password_hashers[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _password_hashers.items() if name != PASSWORD_HASHER
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -144,14 +218,32 @@ AUTH_USER_MODEL = "users.User"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'users.authentication.CachedJWTAuthentication'
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated'
     ],
     #'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 2
+    'PAGE_SIZE': 2,
+    # only views with `throttle_scope` from THROTTLES are throttled
+    'DEFAULT_THROTTLE_CLASSES': ['shared.throttling.RedisThrottle'],
+}
+
+# per endpoint (throttle_scope) and per role (users.models.Role, "anonymous", "*" - others), see shared/throttling.py
+THROTTLES = {
+    "orders": {
+        "algorithm": "token_bucket",
+        "rates": {"admin": None, "support": "120/min", "*": "20/min"},
+    },
+    "auth": {
+        "algorithm": "sliding_window",
+        "rates": {"*": "10/min"},  # anonymous clients by IP
+    },
+    "registration": {
+        "algorithm": "sliding_window",
+        "rates": {"*": "20/hour"},
+    },
 }
 
 # client - server communication
@@ -168,7 +260,7 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": False,
-    "UPDATE_LAST_LOGIN": True,  # TODO: updated from False
+    "UPDATE_LAST_LOGIN": False,  # a write per token issuance; last_login is not used
 
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
@@ -195,7 +287,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "users.authentication.TokenObtainSerializer",  # adds role, is_active, token_version claims
     "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
@@ -210,13 +302,46 @@ CACHES = {
     }
 }
 
-ACTIVATION_EXPIRATION_TIME = 40
-ORDER_COOKING_EXPIRATION_TIME = 400  # TODO: TrackingOrder cache record could be removed from cache directly after delivering order (not implemented yet)
+ACTIVATION_EXPIRATION_TIME = 60 * 60 * 24  # seconds the activation link works after the email is sent
+ACTIVATION_EMAIL_MAX_DELAY = 60 * 60  # seconds the key waits for its email: buffer backlog, SMTP outages
+ACTIVATION_KEY_TIME = ACTIVATION_EMAIL_MAX_DELAY + ACTIVATION_EXPIRATION_TIME  # the key expiration before the send
+RESEND_ACTIVATION_WINDOW = 60 * 10  # seconds, sliding window of the limits below
+RESEND_ACTIVATION_EMAIL_LIMIT = 3  # resends of one email per window
+RESEND_ACTIVATION_IP_LIMIT = 20  # resends from one client IP per window
+USER_CACHE_TIME = 60  # authenticated users by id, see users/authentication.py
+# activation emails are buffered and sent in batches over one SMTP connection (users/services.py)
+ACTIVATION_EMAIL_BATCH_SIZE = int(os.getenv("DJANGO_ACTIVATION_EMAIL_BATCH_SIZE", default="200"))
+ACTIVATION_EMAIL_FLUSH_INTERVAL = float(os.getenv("DJANGO_ACTIVATION_EMAIL_FLUSH_INTERVAL", default="5"))  # seconds
+ACTIVATION_EMAIL_RETRIES = 3  # per message on transient SMTP errors, then it waits for the next flush
+ACTIVATION_EMAIL_RETRY_DELAY = 0.5  # seconds, doubled after every retry
+ACTIVATION_EMAIL_FLUSH_TIMEOUT = 60 * 5  # seconds per batch; the lock of a dead flush expires after it
+ORDER_COOKING_EXPIRATION_TIME = 400
+ORDER_FINISHED_EXPIRATION_TIME = 60  # TrackingOrder and external ids are kept for late webhooks after the order is finished
+EXTERNAL_ID_EXPIRATION_TIME = 60 * 60 * 24  # upper bound for in-flight orders; Order.external_ids is the durable copy
+UBER_DELIVERY_TIMEOUT = 60 * 60 * 2  # seconds to wait for the "delivered" webhook, then the order is not delivered
+TRACKING_FLUSH_INTERVAL = 5  # seconds between TrackingOrder snapshots flushes to the database
+TRACKING_FLUSH_BATCH_SIZE = 500
+RESTAURANT_EXPIRATION_TIME = 60 * 60  # restaurant ids by name; also cached in process, see CACHE_LOCAL_NAMESPACES
+WEBHOOK_DEDUPLICATION_TIME = 60 * 60  # providers retry webhooks within an hour
+WEBHOOK_MAPPING_RETRIES = 8  # webhooks received before the external id is saved are retried with backoff
+OUTBOX_BATCH_SIZE = 500  # tasks published by relay_outbox over one broker connection
+OUTBOX_RELAY_INTERVAL = 0.2  # seconds between outbox polls when it is empty
+OUTBOX_DEDUPLICATION_TIME = 60 * 60 * 24  # started outbox task ids, longer than a message could be republished
+
+METRICS_TOKEN = os.getenv("DJANGO_METRICS_TOKEN", default="")  # empty - /metrics/ is closed (open with DEBUG)
+
+# per-request profiling, see shared/profiling.py
+PROFILING_ENABLED = bool(os.getenv("DJANGO_PROFILING", ""))
+PROFILING_SAMPLE_RATE = float(os.getenv("DJANGO_PROFILING_SAMPLE_RATE", default="0.1"))  # share of profiled requests
+PROFILING_QUERY_BUDGET = int(os.getenv("DJANGO_PROFILING_QUERY_BUDGET", default="20"))  # 0 - no budget
+PROFILING_SQL_TIME_BUDGET = float(os.getenv("DJANGO_PROFILING_SQL_TIME_BUDGET", default="0.2"))  # seconds
+PROFILING_TIME_BUDGET = float(os.getenv("DJANGO_PROFILING_TIME_BUDGET", default="1"))  # seconds
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend" # "django.core.mail.backends.console.EmailBackend"
 
 EMAIL_HOST = os.getenv("DJANGO_EMAIL_HOST", default="localhost") #"localhost", "mailing"
 EMAIL_PORT = int(os.getenv("DJANGO_EMAIL_PORT", default="1025"))
+EMAIL_TIMEOUT = 10  # seconds; a hanging relay must not block the flush forever
 # TODO: doesn't work with specified credentials
 # EMAIL_HOST_USER = "mailpit"
 # EMAIL_HOST_PASSWORD = "mailpit"
@@ -243,6 +368,18 @@ CELERY_TASK_QUEUES = {
     "default": {"exchange": "default", "routing_key": "default"},
     "high_priority": {"exchange": "high_priority", "routing_key": "high_priority"},
     "low_priority": {"exchange": "low_priority", "routing_key": "low_priority"},
+    "webhooks": {"exchange": "webhooks", "routing_key": "webhooks"},
 }
 
 CELERY_TASK_ALWAYS_EAGER = bool(os.getenv("CELERY_TASK_ALWAYS_EAGER", default=""))
+
+CELERY_BEAT_SCHEDULE = {
+    "flush-tracking-orders": {
+        "task": "food.tracking.flush_tracking_orders",
+        "schedule": TRACKING_FLUSH_INTERVAL,
+    },
+    "flush-activation-emails": {
+        "task": "users.services.flush_activation_emails",
+        "schedule": ACTIVATION_EMAIL_FLUSH_INTERVAL,
+    },
+}
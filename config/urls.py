@@ -18,19 +18,21 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
 )
+from users.views import TokenObtainView
 from users.views import router as users_router
 from food.views import router as food_router
 from food.views import import_dishes, kfc_webhook, uber_webhook
+from shared.views import metrics
 
 urlpatterns = [
     path("admin/food/dish/import-dishes/", import_dishes, name="import_dishes"),  # should be on the first place
     path("admin/", admin.site.urls),
-    path('auth/token/', TokenObtainPairView.as_view(), name='obtain_token'),
+    path('auth/token/', TokenObtainView.as_view(), name='obtain_token'),
     path("users/", include(users_router.urls)),
     path("food/", include(food_router.urls)),
+    path("metrics/", metrics, name="metrics"),
     path(
         "webhooks/kfc/5834eb6c-63b9-4018-b6d3-04e170278ec2/",
         kfc_webhook,
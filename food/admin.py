@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Dish, Order, OrderItem, Restaurant
+from .models import Dish, Order, OrderItem, OrderStatusHistory, Restaurant
 
 #admin.site.register(Restaurant)
 admin.site.register(OrderItem)
@@ -18,10 +18,17 @@ class DishOrderItemInline(admin.TabularInline):
     model = OrderItem
 
 
+class OrderStatusHistoryInline(admin.TabularInline):
+    model = OrderStatusHistory
+    readonly_fields = ("status", "created_at")
+    extra = 0
+    can_delete = False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("__str__", "status", "delivery_provider", "id")
-    inlines = (DishOrderItemInline,)
+    inlines = (DishOrderItemInline, OrderStatusHistoryInline)
 
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
@@ -0,0 +1,28 @@
+"""
+Order pipeline metrics (exposed on GET /metrics/).
+
+    NOT_STARTED -> COOKING -> COOKED -> DELIVERY_LOOKUP -> DELIVERY -> DELIVERED
+    |__________ order_stage_seconds{stage=<status the order left>} __________|
+"""
+
+from shared.metrics import LATENCY_BUCKETS, STAGE_BUCKETS, Counter, Histogram
+
+ORDERS_CREATED = Counter("orders_created_total", "Created orders", labels=("delivery_provider",))
+ORDER_CREATE_LATENCY = Histogram(
+    "order_create_seconds", "Time to create the order and schedule its processing (POST /food/orders/)"
+)
+ORDER_SCHEDULE_DELAY = Histogram(
+    "order_schedule_delay_seconds",
+    "Time from schedule_order enqueueing a restaurant task to the task start",
+    labels=("restaurant",),
+    buckets=LATENCY_BUCKETS + (30, 60, 120),
+)
+ORDER_STAGE_DURATION = Histogram(
+    "order_stage_seconds", "Time the order spent in the status", labels=("stage",), buckets=STAGE_BUCKETS
+)
+PROVIDER_LATENCY = Histogram(
+    "provider_request_seconds", "Restaurant and delivery providers API latency", labels=("provider", "operation")
+)
+PROVIDER_ERRORS = Counter(
+    "provider_request_errors_total", "Failed providers API requests", labels=("provider", "operation")
+)
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("food", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderStatusHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("not_started", "Not started"),
+                            ("cooking_rejected", "Cooking rejected"),
+                            ("cooking", "Cooking"),
+                            ("cooked", "Cooked"),
+                            ("delivery_lookup", "Delivery lookup"),
+                            ("delivery", "Delivery"),
+                            ("delivered", "Delivered"),
+                            ("not_delivered", "Not delivered"),
+                            ("cancelled_by_customer", "Cancelled by customer"),
+                            ("cancelled_by_manager", "Cancelled by manager"),
+                            ("cancelled_by_admin", "Cancelled by admin"),
+                            ("cancelled_by_restaurant", "Cancelled by restaurant"),
+                            ("cancelled_by_driver", "Cancelled by driver"),
+                            ("failed", "Failed"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_history",
+                        to="food.order",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "order_status_history",
+                "ordering": ("created_at",),
+            },
+        ),
+    ]
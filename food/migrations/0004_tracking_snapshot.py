@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("food", "0003_order_external_ids"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrackingSnapshot",
+            fields=[
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="tracking",
+                        serialize=False,
+                        to="food.order",
+                    ),
+                ),
+                ("restaurants", models.JSONField(default=dict)),
+                ("delivery", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "tracking_snapshots",
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
 
@@ -33,6 +34,10 @@ class Dish(models.Model):
 class Order(models.Model):
     class Meta:
         db_table = "orders"
+        indexes = [
+            # lookups by external id: external_ids__contains={"kfc": "edf055b8-..."}
+            GinIndex(fields=["external_ids"], name="orders_external_ids_gin"),
+        ]
 
     status = models.CharField(
         max_length=50, choices=OrderStatus.choices(), default=OrderStatus.NOT_STARTED
@@ -41,6 +46,8 @@ class Order(models.Model):
     eta = models.DateField()
     total = models.PositiveIntegerField(null=True, blank=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # durable copy of the cached external ids index: {"kfc": "edf055b8-...", "uber": "..."}
+    external_ids = models.JSONField(default=dict, blank=True)
 
     def __str__(self) -> str:
         return f"[{self.pk}] {self.status} for {self.user.email}"
@@ -72,6 +79,41 @@ class Order(models.Model):
         )
 
 
+class OrderStatusHistory(models.Model):
+    """Append-only log of order status transitions (written by food.transitions)."""
+
+    class Meta:
+        db_table = "order_status_history"
+        ordering = ("created_at",)
+
+    order = models.ForeignKey("Order", on_delete=models.CASCADE, related_name="status_history")
+    status = models.CharField(max_length=50, choices=OrderStatus.choices())
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Order status history is append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self) -> str:
+        return f"[{self.order_id}] {self.status} at {self.created_at}"
+
+
+class TrackingSnapshot(models.Model):
+    """Durable copy of the cached TrackingOrder (written in batches by food.tracking)."""
+
+    class Meta:
+        db_table = "tracking_snapshots"
+
+    order = models.OneToOneField("Order", on_delete=models.CASCADE, primary_key=True, related_name="tracking")
+    restaurants = models.JSONField(default=dict)
+    delivery = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"[{self.order_id}] tracking at {self.updated_at}"
+
+
 class OrderItem(models.Model):
     class Meta:
         db_table = "order_items"
@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from food.metrics import PROVIDER_ERRORS, PROVIDER_LATENCY
+from shared.task_metrics import blocked
+
+
+@contextmanager
+def measured(provider: str, operation: str):
+    """Observe provider API request latency and count failures.
+
+    Inside a Celery task the request is also accounted as its blocked (I/O) time.
+    """
+
+    try:
+        with PROVIDER_LATENCY.time(provider=provider, operation=operation), blocked("io"):
+            yield
+    except Exception:
+        PROVIDER_ERRORS.inc(provider=provider, operation=operation)
+        raise
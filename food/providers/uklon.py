@@ -4,6 +4,8 @@ import os
 
 import httpx
 
+from . import measured
+
 
 class OrderStatus(enum.StrEnum):
     NOT_STARTED = "not started"
@@ -32,12 +34,14 @@ class Client:
 
     @classmethod
     def create_order(cls, order: OrderRequestBody):
-        response: httpx.Response = httpx.post(cls.BASE_URL, json=asdict(order))
-        response.raise_for_status()
+        with measured("uklon", "create_order"):
+            response: httpx.Response = httpx.post(cls.BASE_URL, json=asdict(order))
+            response.raise_for_status()
         return OrderResponse(**response.json())
 
     @classmethod
     def get_order(cls, order_id: str):
-        response: httpx.Response = httpx.get(f"{cls.BASE_URL}/{order_id}")
-        response.raise_for_status()
+        with measured("uklon", "get_order"):
+            response: httpx.Response = httpx.get(f"{cls.BASE_URL}/{order_id}")
+            response.raise_for_status()
         return OrderResponse(**response.json())
@@ -1,63 +1,85 @@
-from dataclasses import dataclass, field, asdict
-from time import sleep
+from time import time
 from threading import Thread
 import random
 
-from django.db.models import QuerySet
+from django.db.models import JSONField, Value
+from django.db.models.expressions import CombinedExpression, F
 from django.conf import settings
 
 from shared.cache import CacheService
+from shared.outbox import OutboxTask, enqueue
+from shared.task_metrics import wait
 from config import celery_app
 
 from food.providers import uklon, uber
 from .enums import OrderStatus
+from .metrics import ORDER_SCHEDULE_DELAY
 from .mapper import RESTAURANT_EXTERNAL_TO_INTERNAL
 from .models import Order, OrderItem, Restaurant
 from .providers import kfc, silpo
+from .tracking import TrackingOrder, TrackingStore
+from .transitions import move_order
 
 
-@dataclass
-class TrackingOrder:
-    """
-    {
-        17: {  // internal Order.id
-            restaurants: {
-                1: {  // internal restaurant id
-                    status: NOT_STARTED, // internal
-                    external_id: 13,
-                    request_body: {...},
-                },
-                2: {  // internal restaurant id
-                    status: NOT_STARTED, // internal
-                    external_id: edf055b8-06e8-40ed-ab35-300fef3e0a5d,
-                    request_body: {...},
-                },
-            },
-            delivery: {
-                location: (..., ...),
-                status: NOT STARTED, DELIVERY, DELIVERED
-            }
-        },
-        18: ...
-    }
-    """
-    restaurants: dict = field(default_factory=dict)
-    delivery: dict = field(default_factory=dict)
+def save_external_id(provider: str, external_id: str, order_id: int):
+    """Save provider's order id to the cache index and to the Order.external_ids."""
 
+    cache = CacheService()
+    cache.set_external_id(provider, external_id, order_id, ttl=settings.EXTERNAL_ID_EXPIRATION_TIME)
+
+    # merge on the DB side: external_ids || {"kfc": "..."}, other providers could write concurrently
+    Order.objects.filter(id=order_id).update(
+        external_ids=CombinedExpression(
+            F("external_ids"), "||", Value({provider: external_id}, JSONField()), output_field=JSONField()
+        )
+    )
+
+
+def get_internal_order_id(provider: str, external_id: str) -> int | None:
+    """Find Order.id by provider's order id. The cache is filled back from the DB on miss."""
 
-def all_orders_cooked(order_id: int):
     cache = CacheService()
-    tracking_order = TrackingOrder(**cache.get(namespace="orders", key=str(order_id)))
+    order_id = cache.get_external_id(provider, external_id)
+    if order_id is not None:
+        return order_id
+
+    order_id = (
+        Order.objects.filter(external_ids__contains={provider: external_id})
+        .values_list("id", flat=True)
+        .first()
+    )
+    if order_id is not None:
+        cache.set_external_id(provider, external_id, order_id, ttl=settings.EXTERNAL_ID_EXPIRATION_TIME)
+
+    return order_id
+
+
+def get_restaurant_id(name: str) -> int:
+    """Restaurants are read-mostly, so their ids are served from the in-process cache (L1)."""
+
+    cache = CacheService()
+    cached: dict | None = cache.get(namespace="restaurants", key=name)
+    if cached is not None:
+        return cached["id"]
+
+    restaurant_id: int = Restaurant.objects.values_list("id", flat=True).get(name=name)
+    cache.set(namespace="restaurants", key=name, value={"id": restaurant_id}, ttl=settings.RESTAURANT_EXPIRATION_TIME)
+
+    return restaurant_id
+
+
+def all_orders_cooked(order_id: int):
+    tracking = TrackingStore()
+    tracking_order = tracking.get(order_id)
     print(f"Checking if all orders are cooked: internal_id = {order_id}, {tracking_order.restaurants}")
 
     if all((payload["status"] == OrderStatus.COOKED for _, payload in tracking_order.restaurants.items())):
-        order = Order.objects.filter(id=order_id)
-        order.update(status=OrderStatus.COOKED)
-        #Order.objects.filter(id=order_id).update(status=OrderStatus.COOKED)
-        print("✅ All orders are COOKED")
+        # only the caller that actually moved the order starts the delivery
+        if move_order(order_id, OrderStatus.COOKED):
+            print("✅ All orders are COOKED")
 
-        # Start orders delivery
-        schedule_delivery(order.first().id)
+            # Start orders delivery
+            schedule_delivery(order_id)
     else:
         print(f"Not all orders are cooked: {tracking_order=}")
 
@@ -66,25 +88,24 @@ def schedule_delivery(order_id):
     delivery_provider = Order.objects.filter(id=order_id).first().delivery_provider
     match delivery_provider.lower():
         case "uklon":
-            order_delivery_by_uklon.delay(order_id)
+            enqueue(order_delivery_by_uklon, order_id)
         case "uber":
-            order_delivery_by_uber.delay(order_id)
+            enqueue(order_delivery_by_uber, order_id)
         case _:
             raise ValueError(f"Delivery provider {delivery_provider} is not available for processing")
 
 
-@celery_app.task(queue="default")
+@celery_app.task(queue="default", base=OutboxTask)
 def order_delivery_by_uklon(order_id: int):
     """Using Uklon provider - start processing delivery order."""
     print("🚚 DELIVERY PROCESSING STARTED (UKLON)")
 
     provider = uklon.Client()
-    cache = CacheService()
+    tracking = TrackingStore()
     order = Order.objects.get(id=order_id)
 
     # update Order state
-    order.status = OrderStatus.DELIVERY_LOOKUP
-    order.save()
+    move_order(order_id, OrderStatus.DELIVERY_LOOKUP)
 
     # prepare data for the first request
     addresses: list[str] = []
@@ -94,16 +115,12 @@ def order_delivery_by_uklon(order_id: int):
         addresses.append(address)
         comments.append(f"Delivery to the {rest_name}")
 
-    order.status = OrderStatus.DELIVERY
-    order.save()
-
     _response: uklon.OrderResponse = provider.create_order(
         uklon.OrderRequestBody(addresses=addresses, comments=comments)
     )
+    move_order(order_id, OrderStatus.DELIVERY)
 
-    tracking_order = TrackingOrder(**cache.get("orders", str(order.pk)))
-    tracking_order.delivery["status"] = OrderStatus.DELIVERY
-    tracking_order.delivery["location"] = _response.location
+    tracking.update_delivery(order_id, status=OrderStatus.DELIVERY, location=_response.location)
 
     current_status: uklon.OrderStatus = _response.status
 
@@ -113,40 +130,36 @@ def order_delivery_by_uklon(order_id: int):
         print(f"🚙 Uklon [{response.status}]: 📍 {response.location}")
 
         if current_status == response.status:
-            sleep(1)
+            wait(1)
             continue
 
         current_status = response.status  # DELIVERY, DELIVERED
 
-        tracking_order.delivery["location"] = response.location
-
         # update cache
-        cache.set("orders", str(order_id), asdict(tracking_order))
+        tracking.update_delivery(order_id, location=response.location)
 
     print(f"🏁 UKLON [{response.status}]: 📍 {response.location}")
 
-    # update storage
-    Order.objects.filter(id=order_id).update(status=OrderStatus.DELIVERED)
-
     # update the cache
-    tracking_order.delivery["status"] = OrderStatus.DELIVERED
-    cache.set("orders", str(order_id), asdict(tracking_order))
+    tracking.update_delivery(order_id, status=OrderStatus.DELIVERED)
+
+    # update storage (after the cache, the finished order's cache records are expired by the transition)
+    move_order(order_id, OrderStatus.DELIVERED)
 
     print("✅ DONE with Delivery (Uklon)")
 
 
-@celery_app.task(queue="default")
+@celery_app.task(queue="default", base=OutboxTask)
 def order_delivery_by_uber(order_id: int):
     """Using Uber provider - start processing delivery order."""
     print("🚚 DELIVERY PROCESSING STARTED (UBER)")
 
     provider = uber.Client()
-    cache = CacheService()
+    tracking = TrackingStore()
     order = Order.objects.get(id=order_id)
 
     # update Order state
-    order.status = OrderStatus.DELIVERY_LOOKUP
-    order.save()
+    move_order(order_id, OrderStatus.DELIVERY_LOOKUP)
 
     # prepare data for the first request
     addresses: list[str] = []
@@ -156,45 +169,41 @@ def order_delivery_by_uber(order_id: int):
         addresses.append(address)
         comments.append(f"Delivery to the {rest_name}")
 
-    # order.status = OrderStatus.DELIVERY
-    # order.save()
-
     _response: uber.OrderResponse = provider.create_order(
         uber.OrderRequestBody(addresses=addresses, comments=comments)
     )
+    move_order(order_id, OrderStatus.DELIVERY)
 
     # save mapping uber_id -> catering_id
-    cache.set(namespace='uber_delivery', key=_response.id, value={"internal_order_id": order_id})
-
-    # get and process tracking order
-    tracking_order = TrackingOrder(**cache.get("orders", str(order.pk)))
-    tracking_order.delivery["status"] = OrderStatus.DELIVERY
-    tracking_order.delivery["location"] = _response.location
+    save_external_id("uber", _response.id, order_id)
 
-    # update cache
-    cache.set("orders", str(order_id), asdict(tracking_order))
+    # update cache (the "delivered" webhook could be processed already)
+    def start_delivery(tracking_order: TrackingOrder) -> bool:
+        if tracking_order.delivery.get("status") == OrderStatus.DELIVERED:
+            return False
+        tracking_order.delivery |= {"status": OrderStatus.DELIVERY, "location": _response.location}
+        return True
 
-    delivered = False
-    # read cache until status become Delivered
-    while not delivered:
-        sleep(1)
+    tracking.update(order_id, start_delivery)
 
-        tracking_order = TrackingOrder(
-            **cache.get(namespace="orders", key=str(order_id))
-        )
+    # read cache until status become Delivered (updated by webhooks)
+    deadline = time() + settings.UBER_DELIVERY_TIMEOUT
+    while tracking.get(order_id).delivery.get("status") != OrderStatus.DELIVERED:
+        if time() > deadline:
+            print(f"❌ Uber delivery {_response.id} is not finished in {settings.UBER_DELIVERY_TIMEOUT} seconds")
+            move_order(order_id, OrderStatus.NOT_DELIVERED)
+            return
 
-        if tracking_order.delivery["status"] == OrderStatus.DELIVERED:
-            break
+        wait(1)
 
-
-    # update storage
-    Order.objects.filter(id=order_id).update(status=OrderStatus.DELIVERED)
+    # update storage (no-op if the webhook has already moved the order)
+    move_order(order_id, OrderStatus.DELIVERED)
 
     print("✅ DONE with Delivery (Uber)")
 
 
-@celery_app.task(queue="high_priority")
-def order_in_silpo(order_id: int, items: QuerySet[OrderItem]):
+@celery_app.task(queue="high_priority", base=OutboxTask)
+def order_in_silpo(order_id: int, item_ids: list[int], scheduled_at: float | None = None):
     """Short polling requests to the Silpo API
 
     NOTES
@@ -203,23 +212,25 @@ def order_in_silpo(order_id: int, items: QuerySet[OrderItem]):
       no: make order
       yes: get order
     """
+    if scheduled_at is not None:
+        ORDER_SCHEDULE_DELAY.observe(time() - scheduled_at, restaurant="silpo")
+
+    items = OrderItem.objects.filter(id__in=item_ids).select_related("dish")
     client = silpo.Client()
-    cache = CacheService()
-    restaurant = Restaurant.objects.get(name="Silpo")
+    tracking = TrackingStore()
+    restaurant_id = get_restaurant_id("Silpo")
 
     def get_internal_status(status: silpo.OrderStatus) -> OrderStatus:
         return RESTAURANT_EXTERNAL_TO_INTERNAL["silpo"][status]
 
     cooked = False
     while not cooked:
-        sleep(1)  # just a delay
+        wait(1)  # just a delay
 
         # GET ITEM FROM THE CACHE
-        tracking_order = TrackingOrder(
-            **cache.get(namespace="orders", key=str(order_id))
-        )
+        tracking_order = tracking.get(order_id)
         # validate
-        silpo_order = tracking_order.restaurants.get(str(restaurant.pk))
+        silpo_order = tracking_order.restaurants.get(str(restaurant_id))
         if not silpo_order:
             raise ValueError("No Silpo in orders processing")
 
@@ -238,14 +249,8 @@ def order_in_silpo(order_id: int, items: QuerySet[OrderItem]):
             )
             internal_status: OrderStatus = get_internal_status(response.status)
 
-            # UPDATE CACHE WITH EXTERNAL ID AND STATE
-            tracking_order.restaurants[str(restaurant.pk)] |= {
-                "external_id": response.id,
-                "status": internal_status,
-            }
-            cache.set(
-                namespace="orders", key=str(order_id), value=asdict(tracking_order), ttl=settings.ORDER_COOKING_EXPIRATION_TIME
-            )
+            # UPDATE CACHE WITH EXTERNAL ID AND STATE (KFC updates the same TrackingOrder concurrently)
+            tracking.update_restaurant(order_id, restaurant_id, external_id=response.id, status=internal_status)
         else:
             # ✨ IF ALREADY HAVE EXTERNAL ID - JUST RETRIEVE THE ORDER
             # PASS EXTERNAL SILPO ORDER ID
@@ -255,17 +260,12 @@ def order_in_silpo(order_id: int, items: QuerySet[OrderItem]):
             print(f"Tracking for Silpo Order with HTTP GET /orders. Status: {internal_status}")
 
             if silpo_order["status"] != internal_status:  # STATUS HAS CHANGED
-                tracking_order.restaurants[str(restaurant.pk)][
-                    "status"
-                ] = internal_status
+                tracking.update_restaurant(order_id, restaurant_id, status=internal_status)
                 print(f"Silpo order status changed to {internal_status}")
-                cache.set(
-                    namespace="orders", key=str(order_id), value=asdict(tracking_order), ttl=settings.ORDER_COOKING_EXPIRATION_TIME
-                )
 
                 # if started cooking
                 if internal_status == OrderStatus.COOKING:
-                    Order.objects.filter(id=order_id).update(status=OrderStatus.COOKING)
+                    move_order(order_id, OrderStatus.COOKING)
 
             # changed as all_orders_cooked changed to be behavioral function (doesn't return anything, change status)
             # if internal_status == OrderStatus.COOKED:
@@ -285,18 +285,19 @@ def order_in_silpo(order_id: int, items: QuerySet[OrderItem]):
                 cooked = True
                 all_orders_cooked(order_id)
 
-@celery_app.task(queue="high_priority")
-def order_in_kfc(order_id: int, items):
+@celery_app.task(queue="high_priority", base=OutboxTask)
+def order_in_kfc(order_id: int, item_ids: list[int], scheduled_at: float | None = None):
+    if scheduled_at is not None:
+        ORDER_SCHEDULE_DELAY.observe(time() - scheduled_at, restaurant="kfc")
+
+    items = OrderItem.objects.filter(id__in=item_ids).select_related("dish")
     client = kfc.Client()
-    cache = CacheService()
-    restaurant = Restaurant.objects.get(name="KFC")
+    tracking = TrackingStore()
+    restaurant_id = get_restaurant_id("KFC")
 
     def get_internal_status(status: kfc.OrderStatus) -> OrderStatus:
         return RESTAURANT_EXTERNAL_TO_INTERNAL["kfc"][status]
 
-    # GET TRACKING ORDER FROM THE CACHE
-    tracking_order = TrackingOrder(**cache.get(namespace="orders", key=str(order_id)))
-
     response: kfc.OrderResponse = client.create_order(
         kfc.OrderRequestBody(
             order=[kfc.OrderItem(dish=item.dish.name, quantity=item.quantity) for item in items]
@@ -305,28 +306,15 @@ def order_in_kfc(order_id: int, items):
 
     internal_status = get_internal_status(response.status)
 
-    # UPDATE CACHE WITH EXTERNAL ID AND STATE
-    tracking_order.restaurants[str(restaurant.pk)] |= {
-        "external_id": response.id,
-        "status": internal_status,
-    }
-
+    # UPDATE CACHE WITH EXTERNAL ID AND STATE (Silpo updates the same TrackingOrder concurrently)
     print(f"Created MOCKED KFC Order. External ID: {response.id}, Status: {internal_status}")
-    cache.set(namespace="orders", key=str(order_id), value=asdict(tracking_order), ttl=settings.ORDER_COOKING_EXPIRATION_TIME)
+    tracking.update_restaurant(order_id, restaurant_id, external_id=response.id, status=internal_status)
 
     # save another item form Mapping to the Internal Order
-    cache.set(
-        namespace="kfc_orders",
-        key=response.id,  # external KFC order id
-        value={
-            "internal_order_id": order_id,
-        },
-    )
+    save_external_id("kfc", response.id, order_id)
 
     # 🚧 CHECK IF ALL ORDERS ARE COOKED
-    if all_orders_cooked(order_id):
-        cache.set(namespace="orders", key=str(order_id), value=asdict(tracking_order), ttl=settings.ORDER_COOKING_EXPIRATION_TIME)
-        Order.objects.filter(id=order_id).update(status=OrderStatus.COOKED)
+    all_orders_cooked(order_id)
 
 
 # Now building request body is implemented in specific function, but could be moved to separate function
@@ -335,7 +323,7 @@ def order_in_kfc(order_id: int, items):
 
 def schedule_order(order: Order):
     # define services and data state
-    cache = CacheService()
+    tracking = TrackingStore()
     tracking_order = TrackingOrder()
 
     items_by_restaurants = order.items_by_restaurant()
@@ -347,21 +335,23 @@ def schedule_order(order: Order):
         }
 
     # update cache instance only once in the end
-    cache.set(namespace="orders", key=str(order.pk), value=asdict(tracking_order), ttl=settings.ORDER_COOKING_EXPIRATION_TIME)
+    tracking.save(order.pk, tracking_order)
 
     # start processing after cache is complete
     # threads = []
     for restaurant, items in items_by_restaurants.items():
+        # task arguments are stored in the outbox as JSON: pass ids, not the QuerySet
+        item_ids = [item.pk for item in items]
         match restaurant.name.lower():
             case "silpo":
                 #thread = Thread(target=order_in_silpo, args=(order.pk, items), daemon=True)
 
-                order_in_silpo.delay(order.pk, items)
+                enqueue(order_in_silpo, order.pk, item_ids, scheduled_at=time())
                 # or
                 # order_in_silpo.apply_async()
             case "kfc":
                 #thread = Thread(target=order_in_kfc, args=(order.pk, items), daemon=True)
-                order_in_kfc.delay(order.pk, items)
+                enqueue(order_in_kfc, order.pk, item_ids, scheduled_at=time())
             case _:
                 raise ValueError(
                     f"Restaurant {restaurant.name} is not available for processing"
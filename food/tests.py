@@ -1,3 +1,298 @@
-from django.test import TestCase
+import asyncio
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import redis
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+
+from shared.cache import CacheService
+from users.models import User
+
+from .enums import OrderStatus
+from .models import Order, OrderStatusHistory, TrackingSnapshot
+from .tracking import TrackingOrder, TrackingStore
+from .transitions import can_move, move_order
+from .webhooks import MappingNotReady, WebhookEvent, accept_webhook, process_uber_event, process_webhook_event
+
+
+def redis_available() -> bool:
+    try:
+        CacheService().connection.ping()
+    except redis.RedisError:
+        return False
+    return True
+
+
+class CanMoveTests(SimpleTestCase):
+
+    def test_adjacent_transitions(self):
+        self.assertTrue(can_move(OrderStatus.NOT_STARTED, OrderStatus.COOKING))
+        self.assertTrue(can_move(OrderStatus.COOKED, OrderStatus.DELIVERY_LOOKUP))
+        self.assertTrue(can_move(OrderStatus.DELIVERY, OrderStatus.DELIVERED))
+
+    def test_coalesced_transitions(self):
+        self.assertTrue(can_move(OrderStatus.NOT_STARTED, OrderStatus.COOKED))
+        self.assertTrue(can_move(OrderStatus.DELIVERY_LOOKUP, OrderStatus.DELIVERED))
+
+    def test_jumps_are_not_allowed(self):
+        self.assertFalse(can_move(OrderStatus.NOT_STARTED, OrderStatus.DELIVERED))
+        self.assertFalse(can_move(OrderStatus.COOKING, OrderStatus.DELIVERY))
+        self.assertFalse(can_move(OrderStatus.COOKED, OrderStatus.DELIVERED))
+
+    def test_backward_transitions_are_not_allowed(self):
+        self.assertFalse(can_move(OrderStatus.DELIVERY, OrderStatus.DELIVERY_LOOKUP))
+        self.assertFalse(can_move(OrderStatus.COOKED, OrderStatus.COOKING))
+
+    def test_final_statuses(self):
+        for status in OrderStatus:
+            self.assertFalse(can_move(OrderStatus.DELIVERED, status))
+            self.assertFalse(can_move(OrderStatus.FAILED, status))
+
+
+class MoveOrderTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(email="customer@catering.local", phone_number="0000000001")
+        self.order = Order.objects.create(
+            status=OrderStatus.NOT_STARTED,
+            user=user,
+            delivery_provider="uber",
+            eta=date.today() + timedelta(days=1),
+            total=1,
+        )
+
+    def status(self) -> str:
+        return Order.objects.values_list("status", flat=True).get(id=self.order.pk)
+
+    def test_legal_transition_is_written_with_history(self):
+        self.assertTrue(move_order(self.order.pk, OrderStatus.COOKING))
+
+        self.assertEqual(self.status(), OrderStatus.COOKING)
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=self.order).values_list("status", flat=True)),
+            [OrderStatus.COOKING],
+        )
+
+    def test_repeated_transition_is_noop(self):
+        move_order(self.order.pk, OrderStatus.COOKING)
+
+        self.assertFalse(move_order(self.order.pk, OrderStatus.COOKING))
+        self.assertEqual(OrderStatusHistory.objects.filter(order=self.order).count(), 1)
+
+    def test_illegal_transition_is_rejected(self):
+        self.assertFalse(move_order(self.order.pk, OrderStatus.DELIVERY))
+        self.assertEqual(self.status(), OrderStatus.NOT_STARTED)
+        self.assertFalse(OrderStatusHistory.objects.filter(order=self.order).exists())
+
+    def test_outdated_update_does_not_move_order_backwards(self):
+        for status in (OrderStatus.COOKING, OrderStatus.COOKED, OrderStatus.DELIVERY_LOOKUP):
+            move_order(self.order.pk, status)
+
+        self.assertFalse(move_order(self.order.pk, OrderStatus.COOKING))
+        self.assertEqual(self.status(), OrderStatus.DELIVERY_LOOKUP)
+
+    @mock.patch("food.transitions.release_order_cache")
+    def test_final_status_releases_cache(self, release_order_cache):
+        for status in (OrderStatus.COOKING, OrderStatus.COOKED, OrderStatus.DELIVERY_LOOKUP, OrderStatus.DELIVERY):
+            move_order(self.order.pk, status)
+        release_order_cache.assert_not_called()
+
+        self.assertTrue(move_order(self.order.pk, OrderStatus.DELIVERED))
+        release_order_cache.assert_called_once_with(self.order.pk)
+
+    def test_raw_status_is_rejected(self):
+        with self.assertRaises(ValueError):
+            move_order(self.order.pk, "finished")
+
+
+class WebhookEventTests(SimpleTestCase):
+
+    def test_deduplication_key(self):
+        event = WebhookEvent(provider="uber", external_id="abc", status="delivery", sequence="7")
+        self.assertEqual(event.deduplication_key, "uber:abc:delivery:7")
+
+    def test_location_pings_are_not_duplicates(self):
+        first = WebhookEvent(provider="uber", external_id="abc", status="delivery", sequence="1")
+        second = WebhookEvent(provider="uber", external_id="abc", status="delivery", sequence="2")
+        self.assertNotEqual(first.deduplication_key, second.deduplication_key)
+
+    @skipUnless(redis_available(), "Redis is not available")
+    @mock.patch("food.webhooks.process_webhook_event")
+    def test_duplicate_is_enqueued_once(self, process_webhook_event):
+        event = WebhookEvent(provider="uber", external_id="test-duplicate", status="delivered")
+        CacheService().delete(namespace="webhooks", key=event.deduplication_key)
+
+        async def receive_twice():
+            return await accept_webhook(event), await accept_webhook(event)
+
+        try:
+            self.assertEqual(asyncio.run(receive_twice()), (True, False))
+            process_webhook_event.delay.assert_called_once()
+        finally:
+            CacheService().delete(namespace="webhooks", key=event.deduplication_key)
+
+
+    @mock.patch("food.webhooks.process_webhook_event")
+    def test_location_pings_at_the_same_place_are_accepted(self, process_webhook_event):
+        event = WebhookEvent(provider="uber", external_id="abc", status="delivery", location=["1", "2"])
+
+        async def receive_twice():
+            return await accept_webhook(event, deduplicate=False), await accept_webhook(event, deduplicate=False)
+
+        self.assertEqual(asyncio.run(receive_twice()), (True, True))
+        self.assertEqual(process_webhook_event.delay.call_count, 2)
+
+    @skipUnless(redis_available(), "Redis is not available")
+    @mock.patch("food.webhooks.process_webhook_event")
+    def test_event_is_accepted_again_if_not_queued(self, process_webhook_event):
+        event = WebhookEvent(provider="uber", external_id="test-broker-error", status="delivered")
+        process_webhook_event.delay.side_effect = [OSError("broker is unavailable"), None]
+
+        try:
+            with self.assertRaises(OSError):
+                asyncio.run(accept_webhook(event))
+            self.assertTrue(asyncio.run(accept_webhook(event)))
+        finally:
+            CacheService().delete(namespace="webhooks", key=event.deduplication_key)
+
+
+@skipUnless(redis_available(), "Redis is not available")
+@mock.patch("food.transitions.release_order_cache")
+class UberEventTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(email="customer@catering.local", phone_number="0000000001")
+        self.order = Order.objects.create(
+            status=OrderStatus.DELIVERY,
+            user=user,
+            delivery_provider="uber",
+            eta=date.today() + timedelta(days=1),
+            total=1,
+        )
+        self.tracking = TrackingStore()
+        self.tracking.save(self.order.pk, TrackingOrder(delivery={"status": OrderStatus.DELIVERY, "location": []}))
+
+        patcher = mock.patch("food.webhooks.get_internal_order_id", return_value=self.order.pk)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tracking.cache.delete, namespace="orders", key=str(self.order.pk))
+
+    def receive(self, status: str, location: list):
+        process_uber_event(WebhookEvent(provider="uber", external_id="abc", status=status, location=location))
+
+    def test_event_before_mapping_is_retried(self, _):
+        payload = {"provider": "uber", "external_id": "abc", "status": "delivered"}
+
+        with (
+            mock.patch("food.webhooks.get_internal_order_id", side_effect=[None, self.order.pk]),
+            mock.patch.object(process_webhook_event, "retry", side_effect=MappingNotReady) as retry,
+        ):
+            with self.assertRaises(MappingNotReady):
+                process_webhook_event(payload)
+            retry.assert_called_once()
+
+            process_webhook_event(payload)
+
+        self.assertEqual(Order.objects.values_list("status", flat=True).get(id=self.order.pk), OrderStatus.DELIVERED)
+
+    def test_location_ping_updates_cache(self, _):
+        self.receive("delivery", [1, 2])
+
+        self.assertEqual(self.tracking.get(self.order.pk).delivery["location"], [1, 2])
+
+    def test_outdated_event_does_not_move_order_backwards(self, _):
+        self.receive("delivered", [3, 4])
+        self.receive("delivery", [1, 2])
+
+        self.assertEqual(Order.objects.values_list("status", flat=True).get(id=self.order.pk), OrderStatus.DELIVERED)
+        self.assertEqual(
+            self.tracking.get(self.order.pk).delivery, {"status": OrderStatus.DELIVERED, "location": [3, 4]}
+        )
+
+
+@skipUnless(redis_available(), "Redis is not available")
+class TrackingFlushTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(email="customer@catering.local", phone_number="0000000001")
+        self.order = Order.objects.create(
+            status=OrderStatus.NOT_STARTED,
+            user=user,
+            delivery_provider="uber",
+            eta=date.today() + timedelta(days=1),
+            total=1,
+        )
+        self.tracking = TrackingStore()
+        self.tracking.cache.delete(namespace="tracking", key="dirty")
+        self.addCleanup(self.tracking.cache.delete, namespace="tracking", key="dirty")
+        self.addCleanup(self.tracking.cache.delete, namespace="orders", key=str(self.order.pk))
+
+    def dirty(self) -> set[bytes]:
+        return self.tracking.cache.connection.smembers("tracking:dirty")
+
+    def test_order_is_marked_dirty_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracking.save(self.order.pk, TrackingOrder())
+            self.assertEqual(self.dirty(), set())
+
+        self.assertEqual(self.dirty(), {str(self.order.pk).encode()})
+
+    def test_missing_orders_are_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracking.save(self.order.pk, TrackingOrder(delivery={"status": OrderStatus.DELIVERY}))
+        self.tracking.cache.add_members("tracking", "dirty", "999999")
+
+        self.assertEqual(self.tracking.flush(batch_size=10), 2)
+        self.assertEqual(TrackingSnapshot.objects.get(order=self.order).delivery, {"status": OrderStatus.DELIVERY})
+        self.assertFalse(TrackingSnapshot.objects.filter(order_id=999999).exists())
+
+    def test_failed_batch_is_marked_dirty_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracking.save(self.order.pk, TrackingOrder())
+
+        with mock.patch.object(TrackingSnapshot.objects, "bulk_create", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.tracking.flush(batch_size=10)
+
+        self.assertEqual(self.dirty(), {str(self.order.pk).encode()})
+
+
+@skipUnless(redis_available(), "Redis is not available")
+class TrackingUpdateTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tracking = TrackingStore()
+        self.order_id = 10**9
+        self.tracking.cache.set(
+            namespace="orders",
+            key=str(self.order_id),
+            value={
+                "restaurants": {"1": {"status": OrderStatus.NOT_STARTED}, "2": {"status": OrderStatus.NOT_STARTED}},
+                "delivery": {},
+            },
+        )
+        self.addCleanup(self.tracking.cache.delete, namespace="orders", key=str(self.order_id))
+        self.addCleanup(self.tracking.cache.remove_members, "tracking", "dirty", str(self.order_id))
+
+    def test_concurrent_restaurant_updates_are_not_lost(self):
+        original_update = self.tracking.cache.update
+
+        def update_with_concurrent_write(namespace, key, change, ttl=None):
+            def change_after_concurrent_write(payload):
+                if not concurrent_write_done:
+                    concurrent_write_done.append(True)
+                    # the other restaurant task writes between our read and write
+                    TrackingStore().update_restaurant(self.order_id, 2, status=OrderStatus.COOKED)
+                return change(payload)
+
+            return original_update(namespace, key, change_after_concurrent_write, ttl)
+
+        concurrent_write_done: list[bool] = []
+        with mock.patch.object(self.tracking.cache, "update", update_with_concurrent_write):
+            self.tracking.update_restaurant(self.order_id, 1, status=OrderStatus.COOKED, external_id="abc")
+
+        self.assertEqual(
+            self.tracking.get(self.order_id).restaurants,
+            {"1": {"status": OrderStatus.COOKED, "external_id": "abc"}, "2": {"status": OrderStatus.COOKED}},
+        )
@@ -0,0 +1,174 @@
+"""
+TrackingOrder storage.
+
+Redis is the hot copy:     orders:<order id> -> TrackingOrder
+Postgres is the durable one: TrackingSnapshot (written behind, in batches)
+
+    save() -> SET orders:<order id> + SADD tracking:dirty <order id> (on commit)
+    update() -> the same, but read-modify-write with WATCH (for concurrent writers)
+    flush_tracking_orders (beat) -> SPOP tracking:dirty, MGET orders:*, one INSERT ... ON CONFLICT UPDATE
+                                    (on failure the popped ids are added back with SADD)
+    get()  -> GET orders:<order id>, on miss: SELECT snapshot and put it back to the cache
+"""
+
+from dataclasses import dataclass, field, asdict
+from typing import Callable
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from config import celery_app
+from shared.cache import CacheService
+
+from .models import Order, TrackingSnapshot
+
+
+@dataclass
+class TrackingOrder:
+    """
+    {
+        17: {  // internal Order.id
+            restaurants: {
+                1: {  // internal restaurant id
+                    status: NOT_STARTED, // internal
+                    external_id: 13,
+                    request_body: {...},
+                },
+                2: {  // internal restaurant id
+                    status: NOT_STARTED, // internal
+                    external_id: edf055b8-06e8-40ed-ab35-300fef3e0a5d,
+                    request_body: {...},
+                },
+            },
+            delivery: {
+                location: (..., ...),
+                status: NOT STARTED, DELIVERY, DELIVERED
+            }
+        },
+        18: ...
+    }
+    """
+    restaurants: dict = field(default_factory=dict)
+    delivery: dict = field(default_factory=dict)
+
+
+class TrackingStore:
+
+    def __init__(self):
+        self.cache: CacheService = CacheService()
+
+    def save(self, order_id: int, tracking_order: TrackingOrder, ttl: int | None = None):
+        """Update the cache and mark the order to be persisted by the next flush."""
+
+        self.cache.set(
+            namespace="orders",
+            key=str(order_id),
+            value=asdict(tracking_order),
+            ttl=ttl or settings.ORDER_COOKING_EXPIRATION_TIME,
+        )
+        # inside a transaction (schedule_order) the order is not committed yet:
+        # the flush would fail on the TrackingSnapshot.order foreign key
+        transaction.on_commit(lambda: self.cache.add_members("tracking", "dirty", str(order_id)))
+
+    def update(self, order_id: int, change: Callable[[TrackingOrder], bool], ttl: int | None = None) -> bool:
+        """Atomically change the cached TrackingOrder: concurrent updates (e.g. webhooks) are not lost.
+
+        `change` mutates the order and returns False to skip the write. Return True if it is written.
+        """
+
+        def apply(payload: dict) -> dict | None:
+            tracking_order = TrackingOrder(**payload)
+            return asdict(tracking_order) if change(tracking_order) else None
+
+        for _ in range(2):
+            if self.cache.update("orders", str(order_id), apply, ttl=ttl or settings.ORDER_COOKING_EXPIRATION_TIME):
+                transaction.on_commit(lambda: self.cache.add_members("tracking", "dirty", str(order_id)))
+                return True
+            if self.cache.get(namespace="orders", key=str(order_id)) is not None:
+                return False  # the change is skipped
+            self.get(order_id)  # not cached: restore from the snapshot and retry
+
+        return False
+
+    def update_restaurant(self, order_id: int, restaurant_id: int, **fields) -> bool:
+        """Atomically merge `fields` into the restaurant order: restaurants are updated concurrently."""
+
+        def change(tracking_order: TrackingOrder) -> bool:
+            restaurant: dict = tracking_order.restaurants.get(str(restaurant_id), {})
+            tracking_order.restaurants[str(restaurant_id)] = restaurant | fields
+            return True
+
+        return self.update(order_id, change)
+
+    def update_delivery(self, order_id: int, **fields) -> bool:
+        """Atomically merge `fields` into the delivery."""
+
+        def change(tracking_order: TrackingOrder) -> bool:
+            tracking_order.delivery |= fields
+            return True
+
+        return self.update(order_id, change)
+
+    def get(self, order_id: int) -> TrackingOrder:
+        payload: dict | None = self.cache.get(namespace="orders", key=str(order_id))
+        if payload is not None:
+            return TrackingOrder(**payload)
+
+        # cache entry is expired or lost - rehydrate it from the snapshot
+        snapshot = TrackingSnapshot.objects.filter(order_id=order_id).first()
+        if snapshot is None:
+            raise ValueError(f"No tracking information for order {order_id}")
+
+        print(f"TrackingOrder {order_id} is restored from the database")
+        tracking_order = TrackingOrder(restaurants=snapshot.restaurants, delivery=snapshot.delivery)
+        self.cache.set(
+            namespace="orders",
+            key=str(order_id),
+            value=asdict(tracking_order),
+            ttl=settings.ORDER_COOKING_EXPIRATION_TIME,
+        )
+
+        return tracking_order
+
+    def flush(self, batch_size: int) -> int:
+        """Persist one batch of changed TrackingOrders. Return number of processed orders."""
+
+        order_ids: list[str] = self.cache.pop_members("tracking", "dirty", batch_size)
+        if not order_ids:
+            return 0
+
+        payloads = self.cache.get_many(namespace="orders", keys=order_ids)
+        # a deleted order would fail the whole batch with the foreign key violation
+        existing: set[int] = set(Order.objects.filter(id__in=order_ids).values_list("id", flat=True))
+
+        snapshots = [
+            TrackingSnapshot(order_id=int(order_id), **payload)
+            for order_id, payload in zip(order_ids, payloads)
+            if payload is not None  # already expired, the last flushed version stays
+            and int(order_id) in existing
+        ]
+        try:
+            TrackingSnapshot.objects.bulk_create(
+                snapshots,
+                update_conflicts=True,
+                unique_fields=["order"],
+                update_fields=["restaurants", "delivery", "updated_at"],
+            )
+        except DatabaseError:
+            # the popped orders are marked dirty again, so the next flush retries them
+            self.cache.add_members("tracking", "dirty", *order_ids)
+            raise
+
+        return len(order_ids)
+
+
+@celery_app.task(queue="default")
+def flush_tracking_orders():
+    store = TrackingStore()
+    total = 0
+
+    while processed := store.flush(batch_size=settings.TRACKING_FLUSH_BATCH_SIZE):
+        total += processed
+
+    if total:
+        print(f"{total} TrackingOrder snapshots are flushed")
@@ -0,0 +1,141 @@
+"""
+Order lifecycle state machine.
+
+INTERNAL STATUS: {
+    INTERNAL STATUSES ORDER COULD BE MOVED TO
+}
+
+All Order.status writes go through `move_order`, so the transition is validated
+and written with a single conditional UPDATE:
+
+    UPDATE orders SET status = 'delivered' WHERE id = 17 AND status IN ('delivery_lookup', 'delivery')
+
+Only adjacent transitions are legal, plus the few explicitly coalesced ones
+(COALESCED_TRANSITIONS). If the order is already in the target status (or beyond it)
+nothing is written, so duplicated or out-of-order provider updates can't move the order backwards.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from shared.cache import CacheService
+
+from .enums import OrderStatus
+from .metrics import ORDER_STAGE_DURATION
+from .models import Order, OrderStatusHistory
+
+CANCELLED_STATUSES: set[OrderStatus] = {
+    OrderStatus.CANCELLED_BY_CUSTOMER,
+    OrderStatus.CANCELLED_BY_MANAGER,
+    OrderStatus.CANCELLED_BY_ADMIN,
+}
+
+ORDER_TRANSITIONS: dict[OrderStatus, set[OrderStatus]] = {
+    OrderStatus.NOT_STARTED: {
+        OrderStatus.COOKING,
+        OrderStatus.COOKING_REJECTED,
+        OrderStatus.CANCELLED_BY_RESTAURANT,
+        OrderStatus.FAILED,
+        *CANCELLED_STATUSES,
+    },
+    OrderStatus.COOKING: {
+        OrderStatus.COOKED,
+        OrderStatus.CANCELLED_BY_RESTAURANT,
+        OrderStatus.FAILED,
+        *CANCELLED_STATUSES,
+    },
+    OrderStatus.COOKED: {
+        OrderStatus.DELIVERY_LOOKUP,
+        OrderStatus.FAILED,
+        *CANCELLED_STATUSES,
+    },
+    OrderStatus.DELIVERY_LOOKUP: {
+        OrderStatus.DELIVERY,
+        OrderStatus.NOT_DELIVERED,
+        OrderStatus.CANCELLED_BY_DRIVER,
+        OrderStatus.FAILED,
+        *CANCELLED_STATUSES,
+    },
+    OrderStatus.DELIVERY: {
+        OrderStatus.DELIVERED,
+        OrderStatus.NOT_DELIVERED,
+        OrderStatus.CANCELLED_BY_DRIVER,
+        OrderStatus.FAILED,
+    },
+    # final statuses
+    OrderStatus.COOKING_REJECTED: set(),
+    OrderStatus.DELIVERED: set(),
+    OrderStatus.NOT_DELIVERED: set(),
+    OrderStatus.CANCELLED_BY_CUSTOMER: set(),
+    OrderStatus.CANCELLED_BY_MANAGER: set(),
+    OrderStatus.CANCELLED_BY_ADMIN: set(),
+    OrderStatus.CANCELLED_BY_RESTAURANT: set(),
+    OrderStatus.CANCELLED_BY_DRIVER: set(),
+    OrderStatus.FAILED: set(),
+}
+
+FINAL_STATUSES: set[OrderStatus] = {status for status, targets in ORDER_TRANSITIONS.items() if not targets}
+
+
+# Skipped statuses which are legal: they are not reported by every provider
+# or the later update could overtake the earlier one.
+COALESCED_TRANSITIONS: dict[OrderStatus, set[OrderStatus]] = {
+    # KFC webhooks and Silpo polling could report "cooked" without "cooking"
+    OrderStatus.COOKED: {OrderStatus.NOT_STARTED},
+    # "delivered" webhook could arrive before the DELIVERY update of the delivery task
+    OrderStatus.DELIVERED: {OrderStatus.DELIVERY_LOOKUP},
+}
+
+
+def _sources(target: OrderStatus) -> set[OrderStatus]:
+    """Return statuses the order could be moved to the target from: adjacent ones and coalesced."""
+
+    adjacent = {status for status, targets in ORDER_TRANSITIONS.items() if target in targets}
+    return adjacent | COALESCED_TRANSITIONS.get(target, set())
+
+
+# precalculated once, the graph is static
+TRANSITION_SOURCES: dict[OrderStatus, set[OrderStatus]] = {status: _sources(status) for status in OrderStatus}
+
+
+def can_move(current: OrderStatus, target: OrderStatus) -> bool:
+    return current in TRANSITION_SOURCES[target]
+
+
+def move_order(order_id: int, status: OrderStatus | str) -> bool:
+    """Move the order to the status if the transition is legal.
+
+    Return True if the status was changed, False if the order was already
+    in this status or the transition is not allowed (e.g. outdated webhook).
+    """
+
+    target = OrderStatus(status)  # ValueError for raw (external) statuses
+
+    with transaction.atomic():
+        updated = Order.objects.filter(id=order_id, status__in=TRANSITION_SOURCES[target]).update(status=target)
+        if updated:
+            previous = OrderStatusHistory.objects.filter(order_id=order_id).order_by("-created_at").first()
+            entry = OrderStatusHistory.objects.create(order_id=order_id, status=target)
+
+    if updated and previous is not None:
+        # time spent in the previous status (with coalesced updates - in the skipped one too)
+        ORDER_STAGE_DURATION.observe((entry.created_at - previous.created_at).total_seconds(), stage=previous.status)
+
+    if not updated:
+        print(f"Order {order_id} is not moved to {target}: already there or transition is not allowed")
+    elif target in FINAL_STATUSES:
+        release_order_cache(order_id)
+
+    return bool(updated)
+
+
+def release_order_cache(order_id: int):
+    """Expire cached TrackingOrder and external ids of the finished order.
+
+    Records are kept for ORDER_FINISHED_EXPIRATION_TIME for late webhooks and pollers,
+    so Redis holds only in-flight orders.
+    """
+
+    cache = CacheService()
+    cache.expire(namespace="orders", key=str(order_id), ttl=settings.ORDER_FINISHED_EXPIRATION_TIME)
+    cache.expire_external_ids(order_id, ttl=settings.ORDER_FINISHED_EXPIRATION_TIME)
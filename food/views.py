@@ -2,7 +2,6 @@ import csv
 import io
 from datetime import date
 import json
-from dataclasses import asdict
 from typing import Any
 
 from rest_framework import  viewsets, serializers, routers, permissions
@@ -21,11 +20,13 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils.decorators import method_decorator
 
-from shared.cache import CacheService
-from .models import Restaurant, Dish, Order, OrderItem, OrderStatus
+from .models import Restaurant, Dish, Order, OrderItem, OrderStatus, OrderStatusHistory
 from .enums import DeliveryProvider
+from .metrics import ORDER_CREATE_LATENCY, ORDERS_CREATED
 from users.models import User, Role
-from .services import TrackingOrder, all_orders_cooked, schedule_order, schedule_delivery
+from .services import schedule_order
+from .providers import kfc, uber
+from .webhooks import WebhookEvent, accept_webhook
 
 class DishSerializer(serializers.ModelSerializer):
 
@@ -166,6 +167,8 @@ class FoodFilters(BaseFilters):
 
 class FoodAPIViewSet(viewsets.GenericViewSet):
 
+    throttle_scope = "orders"  # see THROTTLES
+
     def get_permissions(self):
         match self.action:
             case "all_orders" | "create_dish":
@@ -173,6 +176,12 @@ class FoodAPIViewSet(viewsets.GenericViewSet):
             case _:
                 return [permissions.IsAuthenticated()]
 
+    def get_throttles(self):
+        # order creation fans out to providers and Celery tasks, reads are cheap
+        if self.action == "orders" and self.request.method == "POST":
+            return super().get_throttles()
+        return []
+
 
     @method_decorator(cache_page(10))
     @action(methods=["get"], detail=False) # if True, primary key is expected in router
@@ -236,6 +245,7 @@ class FoodAPIViewSet(viewsets.GenericViewSet):
     # or rename url_path
     #@transaction.atomic
     #@action(methods=["post"], detail=False, url_path=r"create-orders")
+    @ORDER_CREATE_LATENCY.time()
     def create_order(self, request: Request):
         """
         >>> HTTP Request
@@ -264,27 +274,30 @@ class FoodAPIViewSet(viewsets.GenericViewSet):
         user: User = request.user
         assert type(request.user) is User
 
-        order = Order.objects.create(
-            status=OrderStatus.NOT_STARTED,
-            user=user,
-            delivery_provider=request.data["delivery_provider"],
-            eta=serializer.validated_data["eta"],
-            total=serializer.calculated_total
-        )
-
-        items = serializer.validated_data["items"]
-
-        for dish_order in items:
-            instance = OrderItem.objects.create(
-                dish=dish_order["dish"],
-                quantity=dish_order["quantity"],
-                order=order
+        # validation above runs without a transaction, locks are held only for the writes
+        with transaction.atomic():
+            order = Order.objects.create(
+                status=OrderStatus.NOT_STARTED,
+                user=user,
+                delivery_provider=request.data["delivery_provider"],
+                eta=serializer.validated_data["eta"],
+                total=serializer.calculated_total
             )
-            print(f"New dish order item is created: {instance.pk}")
+            OrderStatusHistory.objects.create(order=order, status=order.status)
 
-        print(f"New food order is created: {order.pk}. ETA: {order.eta}")
+            items = serializer.validated_data["items"]
+
+            instances = OrderItem.objects.bulk_create(
+                OrderItem(dish=dish_order["dish"], quantity=dish_order["quantity"], order=order)
+                for dish_order in items
+            )
+            print(f"New dish order items are created: {[instance.pk for instance in instances]}")
+
+            # tasks are published after the commit
+            schedule_order(order)
 
-        schedule_order(order)
+        print(f"New food order is created: {order.pk}. ETA: {order.eta}")
+        ORDERS_CREATED.inc(delivery_provider=order.delivery_provider)
 
         return Response(
         #     data={
@@ -361,18 +374,20 @@ def import_dishes(request):
     reader = csv.DictReader(io.StringIO(decoded))
     total = 0
 
-    for row in reader:
-        restaurant_name = row["restaurant"]
-        try:
-            rest = Restaurant.objects.get(name__icontains=restaurant_name.lower())
-        except Restaurant.DoesNotExist:
-            print(f"Skipping restaurant {restaurant_name}")
-            continue
-        else:
-            print(f"Restaurant {rest} found")
+    # all or nothing
+    with transaction.atomic():
+        for row in reader:
+            restaurant_name = row["restaurant"]
+            try:
+                rest = Restaurant.objects.get(name__icontains=restaurant_name.lower())
+            except Restaurant.DoesNotExist:
+                print(f"Skipping restaurant {restaurant_name}")
+                continue
+            else:
+                print(f"Restaurant {rest} found")
 
-        Dish.objects.create(name=row["name"], price=int(row["price"]), restaurant=rest)
-        total += 1
+            Dish.objects.create(name=row["name"], price=int(row["price"]), restaurant=rest)
+            total += 1
 
     print(f"{total} dishes uploaded to the database")
 
@@ -380,56 +395,47 @@ def import_dishes(request):
 
 
 @csrf_exempt
-def kfc_webhook(request):
-    """Process KFC Order webhooks."""
+async def kfc_webhook(request):
+    """Accept KFC Order webhooks. Processing is done by the worker."""
 
     print("KFC Webhook is Handled")
     data: dict = json.loads(json.dumps(request.POST))
 
-    cache = CacheService()
-    restaurant = Restaurant.objects.get(name="KFC")
-    kfc_cache_order = cache.get("kfc_orders", key=data["id"])
-
-    # get internal order from the mapping
-    # add logging if order wasn't found
+    if not data.get("id") or data.get("status") not in set(kfc.OrderStatus):
+        return JsonResponse({"message": "id and valid status are required"}, status=400)
 
-    order: Order = Order.objects.get(id=kfc_cache_order["internal_order_id"])
-    tracking_order = TrackingOrder(**cache.get(namespace="orders", key=str(order.pk)))
-    tracking_order.restaurants[str(restaurant.pk)] |= {
-        "external_id": data["id"],
-        "status": OrderStatus.COOKED,
-    }
+    await accept_webhook(WebhookEvent(provider="kfc", external_id=data["id"], status=data["status"]))
 
-    cache.set(namespace="orders", key=str(order.pk), value=asdict(tracking_order))
-    all_orders_cooked(order.pk)
-
-    return JsonResponse({"message": "ok"})
+    return JsonResponse({"message": "accepted"}, status=202)
 
 
 @csrf_exempt
-def uber_webhook(request):
-    """Process Uber Delivery webhooks."""
+async def uber_webhook(request):
+    """Accept Uber Delivery webhooks. Processing is done by the worker."""
     print("Uber Webhook is Handled")
 
     body = request.POST
     # request.POST returns QueryDict object with all values as lists. To get values need to use get or getlist methods
     data = {'id': body.get('id'), 'status': body.get('status'), 'location': body.getlist('location')}
 
-    # update TrackingOrder with new Status and Location
-    cache = CacheService()
-    order_id = cache.get("uber_delivery", key=data["id"])["internal_order_id"]
-
-    order: Order = Order.objects.filter(id=order_id)
-    order.update(status=data['status'])
-
-    tracking_order = TrackingOrder(**cache.get(namespace="orders", key=str(order.first().pk)))
-    tracking_order.delivery |= {
-        "status": data['status'],
-        "location": data["location"]
-    }
-    cache.set(namespace="orders", key=str(order.first().pk), value=asdict(tracking_order))
-
-    return JsonResponse({"message": "ok"})
+    if not data["id"] or data["status"] not in set(uber.OrderStatus):
+        return JsonResponse({"message": "id and valid status are required"}, status=400)
+
+    sequence: str = body.get("sequence", "")
+    await accept_webhook(
+        WebhookEvent(
+            provider="uber",
+            external_id=data["id"],
+            status=data["status"],
+            sequence=sequence,
+            location=data["location"],
+        ),
+        # without sequence numbers location pings can't be told from retries (a driver could stand still),
+        # they are not deduplicated: the status is applied once anyway (move_order), the location is overwritten
+        deduplicate=bool(sequence) or data["status"] != uber.OrderStatus.DELIVERY,
+    )
+
+    return JsonResponse({"message": "accepted"}, status=202)
 
 
 router = routers.DefaultRouter()
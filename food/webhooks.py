@@ -0,0 +1,140 @@
+"""
+Providers webhooks ingestion.
+
+HTTP handler (async, served by ASGI) only validates the payload, drops duplicates
+and pushes the event to the "webhooks" queue. The event is processed later by
+`process_webhook_event` task in the webhooks worker pool.
+
+DEDUPLICATION KEY: webhooks:<provider>:<external id>:<status>:<sequence>
+"""
+
+from dataclasses import asdict, dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from config import celery_app
+from shared.cache import AsyncCacheService
+
+from .enums import OrderStatus
+from .mapper import DELIVERY_EXTERNAL_TO_INTERNAL, RESTAURANT_EXTERNAL_TO_INTERNAL
+from .models import Order
+from .services import all_orders_cooked, get_internal_order_id, get_restaurant_id
+from .tracking import TrackingOrder, TrackingStore
+from .transitions import can_move, move_order
+
+
+class MappingNotReady(Exception):
+    """The webhook came before the task saved the external id of the order (save_external_id)."""
+
+
+@dataclass
+class WebhookEvent:
+    provider: str
+    external_id: str
+    status: str  # external status
+    sequence: str = ""  # distinguishes events with the same status (e.g. location pings)
+    location: list = field(default_factory=list)
+
+    @property
+    def deduplication_key(self) -> str:
+        return f"{self.provider}:{self.external_id}:{self.status}:{self.sequence}"
+
+
+async def accept_webhook(event: WebhookEvent, deduplicate: bool = True) -> bool:
+    """Enqueue the event for processing if it wasn't received before.
+
+    Return False for duplicates (e.g. provider retries).
+    deduplicate=False - the event has no unique key (location pings), processing it twice is harmless.
+    """
+
+    cache = AsyncCacheService()
+    is_new = not deduplicate or await cache.add(
+        namespace="webhooks",
+        key=event.deduplication_key,
+        value={"status": event.status},
+        ttl=settings.WEBHOOK_DEDUPLICATION_TIME,
+    )
+
+    if not is_new:
+        print(f"Duplicated {event.provider} webhook is skipped: {event.deduplication_key}")
+        return False
+
+    # publishing to the broker is blocking - run it in the thread
+    try:
+        await sync_to_async(process_webhook_event.delay)(asdict(event))
+    except Exception:
+        # the event is not queued: the provider retry must not be taken for a duplicate
+        if deduplicate:
+            await cache.delete(namespace="webhooks", key=event.deduplication_key)
+        raise
+
+    return True
+
+
+def process_kfc_event(event: WebhookEvent):
+    tracking = TrackingStore()
+    restaurant_id = get_restaurant_id("KFC")
+
+    # get internal order from the mapping
+    order_id = get_internal_order_id("kfc", event.external_id)
+    if order_id is None:
+        raise MappingNotReady(f"No order for KFC order {event.external_id}")
+
+    # the Silpo task updates the same TrackingOrder concurrently
+    tracking.update_restaurant(
+        order_id,
+        restaurant_id,
+        external_id=event.external_id,
+        status=RESTAURANT_EXTERNAL_TO_INTERNAL["kfc"][event.status],
+    )
+    all_orders_cooked(order_id)
+
+
+def process_uber_event(event: WebhookEvent):
+    tracking = TrackingStore()
+    order_id = get_internal_order_id("uber", event.external_id)
+    if order_id is None:
+        raise MappingNotReady(f"No order for Uber delivery {event.external_id}")
+
+    internal_status: OrderStatus = DELIVERY_EXTERNAL_TO_INTERNAL["uber"][event.status]
+    # the database is the source of truth: the cached status could be outdated
+    current_status = Order.objects.values_list("status", flat=True).get(id=order_id)
+    if current_status != internal_status and not can_move(current_status, internal_status):
+        # events are not ordered: "delivery" could arrive after "delivered"
+        print(f"Outdated Uber event is skipped for order {order_id}: {current_status} -> {internal_status}")
+        return
+
+    def change(tracking_order: TrackingOrder) -> bool:
+        cached_status = tracking_order.delivery.get("status")
+        if cached_status not in (None, internal_status) and not can_move(cached_status, internal_status):
+            return False
+
+        tracking_order.delivery |= {"status": internal_status, "location": event.location}
+        return True
+
+    tracking.update(order_id, change)
+
+    # location-only ping: the status is already written, so only the cache is updated
+    if current_status != internal_status:
+        move_order(order_id, internal_status)
+
+
+# the event is already deduplicated: if it is dropped, the provider retry is dropped too
+@celery_app.task(
+    queue="webhooks",
+    autoretry_for=(MappingNotReady,),
+    retry_backoff=True,  # 1, 2, 4... seconds
+    retry_backoff_max=30,
+    max_retries=settings.WEBHOOK_MAPPING_RETRIES,
+)
+def process_webhook_event(payload: dict):
+    event = WebhookEvent(**payload)
+
+    match event.provider:
+        case "kfc":
+            process_kfc_event(event)
+        case "uber":
+            process_uber_event(event)
+        case _:
+            raise ValueError(f"Webhooks from {event.provider} are not supported")
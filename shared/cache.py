@@ -2,14 +2,233 @@
     set(key: str, value: dict)
     get(key: str)
     delete(key: str)
+
+Read-mostly namespaces could be cached in process (L1) in front of Redis (L2):
+    CACHE_LOCAL_NAMESPACES="restaurants=300,menu=60"  # namespace=local TTL in seconds
+    CACHE_LOCAL_MAX_SIZE=1000  # entries per process
+Writes of these namespaces are published to the `cache:invalidate` channel,
+so other processes drop their local copies.
+
+Every operation is measured per namespace (see shared.metrics):
+count, latency and payload size. Operations slower than
+CACHE_SLOW_OPERATION_SECONDS are printed.
 """
-from typing import Any
+from collections import OrderedDict
+from contextlib import suppress
+import asyncio
+from typing import Any, AsyncIterator, Callable
 from dataclasses import asdict, dataclass
-import json
 import os
+import threading
+import time
+import uuid
+import weakref
 
 
 import redis
+import redis.asyncio
+
+from .codecs import Codec, decode, get_codec
+from .metrics import SIZE_BUCKETS, Counter, Histogram
+from .profiling import record_cache_operation
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+SLOW_OPERATION_SECONDS = float(os.getenv("CACHE_SLOW_OPERATION_SECONDS", default="0.05"))
+
+CACHE_OPERATIONS = Counter(
+    "cache_operations_total", "Redis operations made by CacheService", labels=("namespace", "operation")
+)
+CACHE_LATENCY = Histogram(
+    "cache_operation_seconds", "Redis operations latency", labels=("namespace", "operation")
+)
+CACHE_PAYLOAD = Histogram(
+    "cache_payload_bytes", "Size of values written to and read from Redis", labels=("namespace", "operation"), buckets=SIZE_BUCKETS
+)
+CACHE_LOCAL_REQUESTS = Counter(
+    "cache_local_requests_total", "In-process cache (L1) lookups", labels=("namespace", "result")
+)
+
+# Rate limiting scripts: the check and the update are atomic, the time is the Redis server time.
+# Sliding window log: ZSET of hits (score - milliseconds). Returns milliseconds to wait, 0 - allowed.
+SLIDING_WINDOW = redis.commands.core.Script(None, b"""
+local now = redis.call("TIME")
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+local limit, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+
+redis.call("ZREMRANGEBYSCORE", KEYS[1], 0, now_ms - window)
+if redis.call("ZCARD", KEYS[1]) < limit then
+    redis.call("ZADD", KEYS[1], now_ms, ARGV[3])
+    redis.call("PEXPIRE", KEYS[1], window)
+    return 0
+end
+
+local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+return math.max(tonumber(oldest[2]) + window - now_ms, 1)
+""")
+
+# Token bucket: HASH {tokens, updated (milliseconds)}, refilled by `rate` tokens per millisecond up to `capacity`.
+TOKEN_BUCKET = redis.commands.core.Script(None, b"""
+local now = redis.call("TIME")
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now_ms
+tokens = math.min(capacity, tokens + (now_ms - updated) * rate)
+
+if tokens < 1 then
+    return math.max(math.ceil((1 - tokens) / rate), 1)
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens - 1), "updated", now_ms)
+redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / rate))
+return 0
+""")
+
+# Return all values of the processing LIST to the head of the queue, in the same order.
+RESTORE_ITEMS = redis.commands.core.Script(None, b"""
+local count = 0
+while redis.call("LMOVE", KEYS[1], KEYS[2], "RIGHT", "LEFT") do
+    count = count + 1
+end
+return count
+""")
+
+# Activation keys (see CacheService.pop_activation_key): the key is deleted together with
+# all other keys of the user, so a key is used once and the rest of them can't be used after it.
+# NOTE: these scripts access keys which are not passed in KEYS (the index members, the index name
+# built from ARGV). It works with a single Redis, but not with Redis Cluster or proxies routing
+# by KEYS: there all keys of the user would need one hash slot (activation:{<user id>}:...).
+POP_ACTIVATION_KEY = redis.commands.core.Script(None, b"""
+local user_id = redis.call("GETDEL", KEYS[1])
+if not user_id then
+    return false
+end
+
+local index = ARGV[1] .. user_id
+for _, key in ipairs(redis.call("SMEMBERS", index)) do
+    redis.call("DEL", key)
+end
+redis.call("DEL", index)
+return user_id
+""")
+
+# The first alive key of the user index with the prolonged expiration; expired ones are removed from the index.
+PROLONG_ACTIVATION_KEY = redis.commands.core.Script(None, b"""
+for _, key in ipairs(redis.call("SMEMBERS", KEYS[1])) do
+    if redis.call("EXPIRE", key, ARGV[1]) == 1 then
+        redis.call("EXPIRE", KEYS[1], ARGV[1])
+        return key
+    end
+    redis.call("SREM", KEYS[1], key)
+end
+return false
+""")
+
+REVOKE_ACTIVATION_KEYS = redis.commands.core.Script(None, b"""
+local keys = redis.call("SMEMBERS", KEYS[1])
+for _, key in ipairs(keys) do
+    redis.call("DEL", key)
+end
+redis.call("DEL", KEYS[1])
+return #keys
+""")
+
+
+def _parse_local_namespaces(value: str) -> dict[str, int]:
+    """'restaurants=300,menu=60' -> {'restaurants': 300, 'menu': 60}"""
+
+    results = {}
+    for item in filter(None, value.split(",")):
+        namespace, _, ttl = item.partition("=")
+        results[namespace.strip()] = int(ttl or 60)
+
+    return results
+
+
+class LocalCache:
+    """Process-wide LRU with TTL. Values are stored encoded, so callers can't mutate cached data."""
+
+    def __init__(self, namespaces: dict[str, int], max_size: int):
+        self.namespaces = namespaces
+        self.max_size = max_size
+        self.entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self.stats: dict[str, dict[str, int]] = {namespace: {"hits": 0, "misses": 0} for namespace in namespaces}
+        self.lock = threading.Lock()
+        self.instance_id = uuid.uuid4().hex  # to skip own invalidation messages
+        self.subscribed = False
+
+    def get(self, namespace: str, key: str) -> bytes | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.stats[namespace]["misses"] += 1
+                CACHE_LOCAL_REQUESTS.inc(namespace=namespace, result="miss")
+                return None
+
+            self.entries.move_to_end(key)
+            self.stats[namespace]["hits"] += 1
+            CACHE_LOCAL_REQUESTS.inc(namespace=namespace, result="hit")
+            return entry[1]
+
+    def set(self, namespace: str, key: str, payload: bytes):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.namespaces[namespace], payload)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def on_invalidation_message(self, message: dict):
+        instance_id, _, key = message["data"].decode().partition("|")
+        if instance_id != self.instance_id:
+            self.invalidate(key)
+
+    def subscribe(self, connection: redis.Redis):
+        """Start background listener for invalidations from other processes (once per process)."""
+
+        with self.lock:
+            if self.subscribed:
+                return
+            self.subscribed = True
+
+        pubsub = connection.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: self.on_invalidation_message})
+        pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+_connection_pool: redis.ConnectionPool | None = None
+_local_cache: LocalCache | None = None
+
+
+def _get_connection_pool() -> redis.ConnectionPool:
+    """One pool per process instead of a new one per CacheService instance."""
+
+    global _connection_pool
+    if _connection_pool is None:
+        _connection_pool = redis.ConnectionPool.from_url(
+            os.getenv("DJANGO_CACHE_URL", default="redis://cache:6379/0")
+        )
+    return _connection_pool
+
+
+def _get_local_cache() -> LocalCache | None:
+    global _local_cache
+    if _local_cache is None:
+        namespaces = _parse_local_namespaces(os.getenv("CACHE_LOCAL_NAMESPACES", default="restaurants=300"))
+        if not namespaces:
+            return None
+        _local_cache = LocalCache(
+            namespaces=namespaces,
+            max_size=int(os.getenv("CACHE_LOCAL_MAX_SIZE", default="1000")),
+        )
+    return _local_cache
+
 
 @dataclass
 class Structure:
@@ -24,33 +243,491 @@ class CacheService:
     """
 
     def __init__(self):
-        self.connection: redis.Redis =  redis.Redis.from_url(
-            os.getenv("DJANGO_CACHE_URL", default="redis://cache:6379/0")
+        self.connection: redis.Redis = redis.Redis(connection_pool=_get_connection_pool())
+        self.local: LocalCache | None = _get_local_cache()
+        # json (default) | orjson | msgpack; values written by any codec are readable
+        self.codec: Codec = get_codec(
+            os.getenv("CACHE_CODEC", default="json"),
+            compress_min_size=int(os.getenv("CACHE_COMPRESS_MIN_SIZE", default="0")),
         )
 
     @staticmethod
     def _build_key(namespace: str, key: str):
         return f"{namespace}:{key}"
 
+    @staticmethod
+    def _record(operation: str, namespace: str, started: float, size: int | None = None):
+        """Measure the Redis operation started at `started` (time.perf_counter)."""
+
+        elapsed = time.perf_counter() - started
+
+        CACHE_OPERATIONS.inc(namespace=namespace, operation=operation)
+        record_cache_operation(elapsed)
+        CACHE_LATENCY.observe(elapsed, namespace=namespace, operation=operation)
+        if size is not None:
+            CACHE_PAYLOAD.observe(size, namespace=namespace, operation=operation)
+
+        if elapsed >= SLOW_OPERATION_SECONDS:
+            print(f"Slow cache operation: {operation} {namespace} took {elapsed * 1000:.1f} ms")
+
+    def _is_local(self, namespace: str) -> bool:
+        return self.local is not None and namespace in self.local.namespaces
+
+    def _invalidate(self, namespace: str, key: str):
+        """Drop local copies of the key in this and other processes."""
+
+        if not self._is_local(namespace):
+            return
+
+        name = self._build_key(namespace, key)
+        self.local.invalidate(name)
+
+        started = time.perf_counter()
+        self.connection.publish(INVALIDATION_CHANNEL, f"{self.local.instance_id}|{name}")
+        self._record("publish", namespace, started)
+
+    def local_stats(self) -> dict[str, dict[str, int]]:
+        """L1 hits/misses per namespace (for this process)."""
+        return {} if self.local is None else {namespace: dict(stats) for namespace, stats in self.local.stats.items()}
+
     def set(self, namespace: str, key: str, value: dict, ttl: int | None = None):
         # if isinstance(value, Structure):
         #     payload = asdict(value)
 
-        payload = json.dumps(value)
+        payload = self.codec.encode(value)
+        started = time.perf_counter()
         self.connection.set(
             name=self._build_key(namespace, key),
             value=payload,
             ex=ttl
         )
+        self._record("set", namespace, started, len(payload))
+        self._invalidate(namespace, key)
 
-    def get(self, namespace: str, key: str):
-        result: str = self.connection.get(
-            self._build_key(namespace, key)
+    def add(self, namespace: str, key: str, value: dict, ttl: int | None = None) -> bool:
+        """Set the value only if the key doesn't exist yet (SET NX).
+
+        Return True if the value was set, False if the key is already there.
+        """
+
+        payload = self.codec.encode(value)
+        started = time.perf_counter()
+        created = self.connection.set(
+            name=self._build_key(namespace, key),
+            value=payload,
+            ex=ttl,
+            nx=True,
         )
+        self._record("add", namespace, started, len(payload))
 
-        return json.loads(result)
+        return bool(created)
+
+    def get(self, namespace: str, key: str):
+        name = self._build_key(namespace, key)
+        is_local = self._is_local(namespace)
+
+        if is_local:
+            self.local.subscribe(self.connection)
+            result = self.local.get(namespace, name)
+            if result is not None:
+                return decode(result)
+
+        started = time.perf_counter()
+        result: bytes | None = self.connection.get(name)
+        self._record("get", namespace, started, len(result) if result is not None else None)
+
+        if result is None:  # expired or never existed
+            return None
+
+        if is_local:
+            self.local.set(namespace, name, result)
+
+        return decode(result)
+
+    def update(self, namespace: str, key: str, change: Callable[[dict], dict | None], ttl: int | None = None) -> bool:
+        """Atomic read-modify-write (optimistic locking with WATCH, retried on concurrent writes).
+
+        `change` gets the current value and returns the new one or None to keep it.
+        Return False if the key doesn't exist or the value is kept.
+        """
+
+        name = self._build_key(namespace, key)
+        started = time.perf_counter()
+
+        with self.connection.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(name)
+                    current: bytes | None = pipeline.get(name)
+                    value = None if current is None else change(decode(current))
+                    if value is None:
+                        pipeline.unwatch()
+                        self._record("update", namespace, started)
+                        return False
+
+                    payload = self.codec.encode(value)
+                    pipeline.multi()
+                    pipeline.set(name=name, value=payload, ex=ttl)
+                    pipeline.execute()
+                    break
+                except redis.WatchError:
+                    continue  # the value was changed meanwhile: read it again
+
+        self._record("update", namespace, started, len(payload))
+        self._invalidate(namespace, key)
+        return True
+
+    def get_many(self, namespace: str, keys: list[str]) -> list[dict | None]:
+        """Get several values with a single MGET. Missing keys are returned as None."""
+
+        if not keys:
+            return []
+
+        started = time.perf_counter()
+        results = self.connection.mget([self._build_key(namespace, key) for key in keys])
+        self._record("get_many", namespace, started, sum(len(result) for result in results if result is not None))
+
+        return [None if result is None else decode(result) for result in results]
 
     def delete(self, namespace: str, key: str):
+        started = time.perf_counter()
         self.connection.delete(
             self._build_key(namespace, key)
         )
+        self._record("delete", namespace, started)
+        self._invalidate(namespace, key)
+
+    def expire(self, namespace: str, key: str, ttl: int) -> bool:
+        """Return False if the key doesn't exist (anymore)."""
+        started = time.perf_counter()
+        exists = self.connection.expire(self._build_key(namespace, key), ttl)
+        self._record("expire", namespace, started)
+        return bool(exists)
+
+    def add_members(self, namespace: str, key: str, *members: str):
+        """Add members to the SET."""
+        started = time.perf_counter()
+        self.connection.sadd(self._build_key(namespace, key), *members)
+        self._record("add_members", namespace, started)
+
+    def remove_members(self, namespace: str, key: str, *members: str):
+        """Remove members from the SET."""
+        started = time.perf_counter()
+        self.connection.srem(self._build_key(namespace, key), *members)
+        self._record("remove_members", namespace, started)
+
+    def pop_members(self, namespace: str, key: str, count: int) -> list[str]:
+        """Remove and return up to `count` random members of the SET."""
+        started = time.perf_counter()
+        members = self.connection.spop(self._build_key(namespace, key), count)
+        self._record("pop_members", namespace, started)
+        return [member.decode() for member in members or []]
+
+    def push_items(self, namespace: str, key: str, *values: dict):
+        """Append values to the LIST (a queue consumed by pop_items)."""
+        payloads = [self.codec.encode(value) for value in values]
+        started = time.perf_counter()
+        self.connection.rpush(self._build_key(namespace, key), *payloads)
+        self._record("push_items", namespace, started, sum(len(payload) for payload in payloads))
+
+    def pop_items(self, namespace: str, key: str, count: int) -> list[dict]:
+        """Remove and return up to `count` oldest values of the LIST."""
+        started = time.perf_counter()
+        payloads = self.connection.lpop(self._build_key(namespace, key), count)
+        self._record("pop_items", namespace, started, sum(len(payload) for payload in payloads or []))
+        return [decode(payload) for payload in payloads or []]
+
+    def move_items(self, namespace: str, key: str, destination: str, count: int) -> list[dict]:
+        """Move up to `count` oldest values of the LIST to the `destination` LIST and return them.
+
+        Reliable queue: values are processed from the destination and removed
+        from it (pop_items) only after that, so they are not lost if the consumer dies.
+        """
+
+        started = time.perf_counter()
+        pipeline = self.connection.pipeline()
+        for _ in range(count):
+            pipeline.lmove(self._build_key(namespace, key), self._build_key(namespace, destination), "LEFT", "RIGHT")
+        payloads: list[bytes] = [payload for payload in pipeline.execute() if payload is not None]
+        self._record("move_items", namespace, started, sum(len(payload) for payload in payloads))
+
+        return [decode(payload) for payload in payloads]
+
+    def restore_items(self, namespace: str, source: str, key: str) -> int:
+        """Return all values of the `source` LIST to the head of the LIST (see move_items). Return their number."""
+
+        started = time.perf_counter()
+        count = RESTORE_ITEMS(
+            keys=[self._build_key(namespace, source), self._build_key(namespace, key)], client=self.connection
+        )
+        self._record("restore_items", namespace, started)
+        return count
+
+    def hit_sliding_window(self, namespace: str, key: str, limit: int, window: float) -> float:
+        """Count the hit if there were less than `limit` hits in the last `window` seconds.
+
+        Return 0 if the hit is allowed, otherwise seconds to wait.
+        """
+
+        started = time.perf_counter()
+        wait_ms = SLIDING_WINDOW(
+            keys=[self._build_key(namespace, key)],
+            args=[limit, int(window * 1000), uuid.uuid4().hex],
+            client=self.connection,
+        )
+        self._record("hit_sliding_window", namespace, started)
+        return wait_ms / 1000
+
+    def take_token(self, namespace: str, key: str, capacity: int, period: float) -> float:
+        """Take a token from the bucket of `capacity` tokens, which is refilled in `period` seconds.
+
+        Return 0 if the token is taken, otherwise seconds to wait for it.
+        """
+
+        started = time.perf_counter()
+        wait_ms = TOKEN_BUCKET(
+            keys=[self._build_key(namespace, key)],
+            args=[repr(capacity / (period * 1000)), capacity],
+            client=self.connection,
+        )
+        self._record("take_token", namespace, started)
+        return wait_ms / 1000
+
+    # EXTERNAL ID INDEX
+    # external_ids:<provider>:<external id> -> {"internal_id": 17}
+    # external_ids:internal:<internal id> -> {external_ids:<provider>:<external id>, ...}
+
+    def set_external_id(self, provider: str, external_id: str, internal_id: int, ttl: int | None = None):
+        """Save external -> internal mapping and register it in the internal id index."""
+
+        key = self._build_key(f"external_ids:{provider}", external_id)
+        index = self._build_key("external_ids:internal", str(internal_id))
+
+        started = time.perf_counter()
+        pipeline = self.connection.pipeline()
+        pipeline.set(name=key, value=self.codec.encode({"internal_id": internal_id}), ex=ttl)
+        pipeline.sadd(index, key)
+        if ttl is not None:
+            pipeline.expire(index, ttl)
+        pipeline.execute()
+        self._record("set_external_id", "external_ids", started)
+
+    def get_external_id(self, provider: str, external_id: str) -> int | None:
+        """Return internal id for the external one or None if there is no mapping."""
+
+        started = time.perf_counter()
+        result = self.connection.get(self._build_key(f"external_ids:{provider}", external_id))
+        self._record("get_external_id", "external_ids", started)
+        if result is None:
+            return None
+
+        return decode(result)["internal_id"]
+
+    def expire_external_ids(self, internal_id: int, ttl: int):
+        """Set TTL for all external ids of the internal one (e.g. when the order is finished)."""
+
+        index = self._build_key("external_ids:internal", str(internal_id))
+        started = time.perf_counter()
+        keys = self.connection.smembers(index)
+
+        pipeline = self.connection.pipeline()
+        for key in keys:
+            pipeline.expire(key, ttl)
+        pipeline.expire(index, ttl)
+        pipeline.execute()
+        self._record("expire_external_ids", "external_ids", started)
+
+    # ACTIVATION KEYS
+    # activation:<activation key> -> <user id>
+    # activation:users:<user id> -> {activation:<activation key>, ...}
+
+    def set_activation_key(self, activation_key: str, user_id: int, ttl: int):
+        """Save the activation key and register it in the user index."""
+
+        key = self._build_key("activation", activation_key)
+        index = self._build_key("activation:users", str(user_id))
+
+        started = time.perf_counter()
+        pipeline = self.connection.pipeline()
+        pipeline.set(name=key, value=str(user_id), ex=ttl)
+        pipeline.sadd(index, key)
+        pipeline.expire(index, ttl)
+        pipeline.execute()
+        self._record("set_activation_key", "activation", started)
+
+    def prolong_activation_key(self, user_id: int, ttl: int) -> str | None:
+        """Return a pending activation key of the user with the expiration set to `ttl`, None if there is none."""
+
+        started = time.perf_counter()
+        key: bytes | None = PROLONG_ACTIVATION_KEY(
+            keys=[self._build_key("activation:users", str(user_id))], args=[ttl], client=self.connection
+        )
+        self._record("prolong_activation_key", "activation", started)
+
+        return None if key is None else key.decode().removeprefix("activation:")
+
+    def pop_activation_key(self, activation_key: str) -> int | None:
+        """Delete the activation key with all other keys of its user. Return the user id, None if the key expired."""
+
+        started = time.perf_counter()
+        user_id: bytes | None = POP_ACTIVATION_KEY(
+            keys=[self._build_key("activation", activation_key)],
+            args=[self._build_key("activation:users", "")],
+            client=self.connection,
+        )
+        self._record("pop_activation_key", "activation", started)
+
+        if user_id is None:
+            return None
+        # values written before the index ({"user_id": 3}) expire within ACTIVATION_EXPIRATION_TIME
+        return int(user_id) if user_id.isdigit() else decode(user_id)["user_id"]
+
+    def revoke_activation_keys(self, user_id: int) -> int:
+        """Delete all activation keys of the user. Return number of deleted keys."""
+
+        started = time.perf_counter()
+        count = REVOKE_ACTIVATION_KEYS(keys=[self._build_key("activation:users", str(user_id))], client=self.connection)
+        self._record("revoke_activation_keys", "activation", started)
+        return count
+
+
+
+# asyncio connections are bound to the event loop they were opened in.
+# ASGI server has one loop per process, but async views under WSGI (runserver)
+# get a new loop per request, so pools are kept per loop and closed with it.
+_async_connection_pools: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, tuple[redis.asyncio.ConnectionPool, AsyncIterator[None]]
+] = weakref.WeakKeyDictionary()
+
+
+async def _close_on_shutdown(pool: redis.asyncio.ConnectionPool) -> AsyncIterator[None]:
+    """The loop closes its async generators before it is closed (asyncio.run, async_to_sync)."""
+    try:
+        yield
+    finally:
+        # the generator refers to the loop (finalizer hook), the entry must not outlive it
+        _async_connection_pools.pop(asyncio.get_running_loop(), None)
+        await pool.aclose()
+
+
+def _get_async_connection_pool() -> redis.asyncio.ConnectionPool:
+    loop = asyncio.get_running_loop()
+    if loop not in _async_connection_pools:
+        pool = redis.asyncio.ConnectionPool.from_url(os.getenv("DJANGO_CACHE_URL", default="redis://cache:6379/0"))
+        closer = _close_on_shutdown(pool)
+        # run the generator up to `yield`: the loop registers it on the first step
+        with suppress(StopIteration):
+            closer.asend(None).send(None)
+        _async_connection_pools[loop] = pool, closer
+    return _async_connection_pools[loop][0]
+
+
+class AsyncCacheService:
+    """
+    CacheService for async views and tasks: the same namespaces, keys and encoding.
+
+    await cache.set(namespace='orders', key='17', value={...}, ttl=400)
+    await cache.get(namespace='orders', key='17') -> {...}
+
+    There is no in-process cache (L1) here, but writes of L1 namespaces
+    are published to other processes the same way.
+    """
+
+    def __init__(self):
+        self.connection: redis.asyncio.Redis = redis.asyncio.Redis(connection_pool=_get_async_connection_pool())
+        self.local: LocalCache | None = _get_local_cache()
+        self.codec: Codec = get_codec(
+            os.getenv("CACHE_CODEC", default="json"),
+            compress_min_size=int(os.getenv("CACHE_COMPRESS_MIN_SIZE", default="0")),
+        )
+
+    _build_key = staticmethod(CacheService._build_key)
+    _record = staticmethod(CacheService._record)
+
+    async def _invalidate(self, namespace: str, key: str):
+        if self.local is None or namespace not in self.local.namespaces:
+            return
+
+        name = self._build_key(namespace, key)
+        self.local.invalidate(name)
+
+        started = time.perf_counter()
+        await self.connection.publish(INVALIDATION_CHANNEL, f"{self.local.instance_id}|{name}")
+        self._record("publish", namespace, started)
+
+    async def set(self, namespace: str, key: str, value: dict, ttl: int | None = None):
+        payload = self.codec.encode(value)
+        started = time.perf_counter()
+        await self.connection.set(name=self._build_key(namespace, key), value=payload, ex=ttl)
+        self._record("set", namespace, started, len(payload))
+        await self._invalidate(namespace, key)
+
+    async def add(self, namespace: str, key: str, value: dict, ttl: int | None = None) -> bool:
+        """Set the value only if the key doesn't exist yet (SET NX)."""
+
+        payload = self.codec.encode(value)
+        started = time.perf_counter()
+        created = await self.connection.set(name=self._build_key(namespace, key), value=payload, ex=ttl, nx=True)
+        self._record("add", namespace, started, len(payload))
+
+        return bool(created)
+
+    async def get(self, namespace: str, key: str):
+        started = time.perf_counter()
+        result: bytes | None = await self.connection.get(self._build_key(namespace, key))
+        self._record("get", namespace, started, len(result) if result is not None else None)
+
+        if result is None:  # expired or never existed
+            return None
+
+        return decode(result)
+
+    async def get_many(self, namespace: str, keys: list[str]) -> list[dict | None]:
+        if not keys:
+            return []
+
+        started = time.perf_counter()
+        results = await self.connection.mget([self._build_key(namespace, key) for key in keys])
+        self._record("get_many", namespace, started, sum(len(result) for result in results if result is not None))
+
+        return [None if result is None else decode(result) for result in results]
+
+    async def delete(self, namespace: str, key: str):
+        started = time.perf_counter()
+        await self.connection.delete(self._build_key(namespace, key))
+        self._record("delete", namespace, started)
+        await self._invalidate(namespace, key)
+
+    async def expire(self, namespace: str, key: str, ttl: int):
+        started = time.perf_counter()
+        await self.connection.expire(self._build_key(namespace, key), ttl)
+        self._record("expire", namespace, started)
+
+    def pipeline(self, transaction: bool = True) -> redis.asyncio.client.Pipeline:
+        """Raw pipeline to batch several commands in one round trip:
+
+        async with cache.pipeline() as pipeline:
+            pipeline.set(cache.build_key("orders", "17"), ...)
+            pipeline.expire(...)
+            await pipeline.execute()
+        """
+        return self.connection.pipeline(transaction=transaction)
+
+    def build_key(self, namespace: str, key: str) -> str:
+        return self._build_key(namespace, key)
+
+    async def subscribe(self, *channels: str) -> AsyncIterator[bytes]:
+        """Yield messages published to the channels until the consumer stops iterating.
+
+        async for message in cache.subscribe("cache:invalidate"):
+            ...
+        """
+
+        pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(*channels)
+        try:
+            async for message in pubsub.listen():
+                yield message["data"]
+        finally:
+            await pubsub.unsubscribe(*channels)
+            await pubsub.aclose()
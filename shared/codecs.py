@@ -0,0 +1,130 @@
+"""
+Cache payload codecs.
+
+Stored value: <version byte><body>
+
+    0x01 - orjson
+    0x02 - msgpack
+    0x11, 0x12 - the same, but the body is zlib-compressed
+
+Values without a version byte are legacy JSON (stdlib json.dumps), so entries
+written before the codec was switched are still readable. The "json" codec keeps
+writing this legacy format.
+
+orjson and msgpack are installed from the Pipfile. They are imported lazily:
+without them only the "json" codec works (the others raise RuntimeError on use).
+"""
+
+from abc import ABC, abstractmethod
+import json
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+COMPRESSED_FLAG = 0x10
+
+
+class Codec(ABC):
+    name: str = ""
+    version: int = 0  # 0 - no version byte (legacy JSON)
+
+    def __init__(self, compress_min_size: int = 0):
+        # 0 - never compress
+        self.compress_min_size = compress_min_size
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes: ...
+
+    @abstractmethod
+    def loads(self, payload: bytes) -> Any: ...
+
+    def encode(self, value: Any) -> bytes:
+        body = self.dumps(value)
+
+        if not self.version:
+            return body
+
+        version = self.version
+        if self.compress_min_size and len(body) >= self.compress_min_size:
+            body = zlib.compress(body)
+            version |= COMPRESSED_FLAG
+
+        return bytes((version,)) + body
+
+
+class JSONCodec(Codec):
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value).encode()
+
+    def loads(self, payload: bytes) -> Any:
+        return json.loads(payload)
+
+
+class ORJSONCodec(Codec):
+    name = "orjson"
+    version = 0x01
+
+    def dumps(self, value: Any) -> bytes:
+        return _require(orjson, self.name).dumps(value)
+
+    def loads(self, payload: bytes) -> Any:
+        return _require(orjson, self.name).loads(payload)
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    version = 0x02
+
+    def dumps(self, value: Any) -> bytes:
+        return _require(msgpack, self.name).packb(value)
+
+    def loads(self, payload: bytes) -> Any:
+        return _require(msgpack, self.name).unpackb(payload)
+
+
+CODECS: dict[str, type[Codec]] = {codec.name: codec for codec in (JSONCodec, ORJSONCodec, MsgpackCodec)}
+DECODERS: dict[int, Codec] = {codec.version: codec() for codec in (ORJSONCodec, MsgpackCodec)}
+LEGACY_DECODER = JSONCodec()
+
+
+def _require(module, name: str):
+    if module is None:
+        raise RuntimeError(f"Cache codec {name} is used, but `{name}` package is not installed")
+    return module
+
+
+def get_codec(name: str, compress_min_size: int = 0) -> Codec:
+    try:
+        codec_class = CODECS[name]
+    except KeyError:
+        raise ValueError(f"Cache codec {name} is not supported. Available: {', '.join(CODECS)}")
+
+    return codec_class(compress_min_size=compress_min_size)
+
+
+def decode(payload: bytes) -> Any:
+    """Decode the value written by any codec."""
+
+    version = payload[0]
+    decoder = DECODERS.get(version & ~COMPRESSED_FLAG)
+
+    if decoder is None:
+        return LEGACY_DECODER.loads(payload)
+
+    body = payload[1:]
+    if version & COMPRESSED_FLAG:
+        body = zlib.decompress(body)
+
+    return decoder.loads(body)
@@ -0,0 +1,164 @@
+"""
+Read replicas routing.
+
+    GET /food/dishes/          -> replica (random one of DATABASE_REPLICAS)
+    POST /food/orders/         -> primary; SET primary_until:<user id> EX REPLICA_STICKINESS_TIME
+    GET /food/orders/17 (< REPLICA_STICKINESS_TIME after the write) -> primary
+
+Only safe requests read from replicas: writes, Celery tasks and management
+commands always use the primary ("default"), so they never see the replication lag.
+Read-your-writes for the client who has just written something is keyed on the user
+of the Bearer JWT (API clients don't keep cookies). The `primary_until` cookie is
+only a fallback for the clients without the token (anonymous ones, admin sessions).
+
+Replicas have no ATOMIC_REQUESTS, so reads are not wrapped in transactions.
+"""
+
+from contextvars import ContextVar
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+import redis
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import AsyncCacheService, CacheService
+
+STICKY_COOKIE = "primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# set by ReplicaRoutingMiddleware for the duration of the request
+use_replica: ContextVar[bool] = ContextVar("use_replica", default=False)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints) -> str | None:
+        if settings.DATABASE_REPLICAS and use_replica.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return "default"
+
+    def db_for_write(self, model, **hints) -> str:
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # replicas have the same data as the primary
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: str | None = None, **hints) -> bool:
+        return db == "default"
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        # without replicas everything reads from the primary: no stickiness to track
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        user_id = self._get_user_id(request)
+        sticky = self._has_sticky_cookie(request)
+        if user_id is not None and request.method in SAFE_METHODS:
+            try:
+                sticky = CacheService().get(namespace="primary_until", key=user_id) is not None
+            except redis.RedisError:
+                sticky = True  # the primary is always consistent
+
+        token = use_replica.set(request.method in SAFE_METHODS and not sticky)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+        if user_id is not None and self._is_write(request, response):
+            try:
+                CacheService().set(
+                    namespace="primary_until", key=user_id, value={}, ttl=settings.REPLICA_STICKINESS_TIME
+                )
+            except redis.RedisError as error:
+                print(f"⚠️ Reads after the write are not sticky: {error}")
+
+        return self._stick(request, response)
+
+    async def __acall__(self, request):
+        user_id = self._get_user_id(request)
+        sticky = self._has_sticky_cookie(request)
+        if user_id is not None and request.method in SAFE_METHODS:
+            try:
+                sticky = await AsyncCacheService().get(namespace="primary_until", key=user_id) is not None
+            except redis.RedisError:
+                sticky = True  # the primary is always consistent
+
+        token = use_replica.set(request.method in SAFE_METHODS and not sticky)
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+        if user_id is not None and self._is_write(request, response):
+            try:
+                await AsyncCacheService().set(
+                    namespace="primary_until", key=user_id, value={}, ttl=settings.REPLICA_STICKINESS_TIME
+                )
+            except redis.RedisError as error:
+                print(f"⚠️ Reads after the write are not sticky: {error}")
+
+        return self._stick(request, response)
+
+    @staticmethod
+    def _get_user_id(request) -> str | None:
+        """User of the Bearer JWT (only the signature is checked, no database queries)."""
+
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = header and authentication.get_raw_token(header)
+        if not raw_token:
+            return None
+
+        try:
+            return str(authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM])
+        except (InvalidToken, TokenError, KeyError):
+            return None  # the view rejects it
+
+    @staticmethod
+    def _has_sticky_cookie(request) -> bool:
+        """Cookie fallback for the clients without the token."""
+
+        try:
+            primary_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            primary_until = 0
+
+        return primary_until >= time.time()
+
+    @staticmethod
+    def _is_write(request, response) -> bool:
+        return request.method not in SAFE_METHODS and response.status_code < 400
+
+    def _stick(self, request, response):
+        """Read from the primary for a while after the successful write."""
+
+        if self._is_write(request, response):
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(time.time() + settings.REPLICA_STICKINESS_TIME),
+                max_age=settings.REPLICA_STICKINESS_TIME,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
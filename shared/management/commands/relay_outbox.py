@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shared.outbox import run_relay
+
+
+class Command(BaseCommand):
+    help = "Publish Celery tasks from the outbox table to the broker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=settings.OUTBOX_RELAY_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="publish the current backlog and exit")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Outbox relay is started: batch size {options['batch_size']}, interval {options['interval']} s")
+        run_relay(batch_size=options["batch_size"], interval=options["interval"], once=options["once"])
@@ -0,0 +1,183 @@
+"""
+Minimal metrics registry with Prometheus text exposition.
+
+    CACHE_OPERATIONS = Counter("cache_operations_total", "Cache operations", labels=("namespace", "operation"))
+    CACHE_OPERATIONS.inc(namespace="orders", operation="get")
+
+Values are collected in process and added to the Redis hash `metrics`
+(one pipeline every METRICS_FLUSH_INTERVAL seconds), so GET /metrics/
+shows totals of all web and worker processes:
+
+    metrics: {
+        'cache_operations_total{namespace="orders",operation="get"}': 42,
+        'cache_operation_seconds_bucket{namespace="orders",operation="get",le="0.005"}': 40,
+        ...
+    }
+"""
+
+from contextlib import contextmanager
+import atexit
+import os
+import threading
+import time
+
+import redis
+
+METRICS_KEY = "metrics"
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", default="5"))
+
+# seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# seconds, for long business processes (cooking, delivery)
+STAGE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+# bytes
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: dict[str, "Metric"] = {}
+        self.pending: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.connection: redis.Redis | None = None
+
+    def _get_connection(self) -> redis.Redis:
+        # not CacheService: cache operations are measured themselves
+        if self.connection is None:
+            self.connection = redis.Redis.from_url(os.getenv("DJANGO_CACHE_URL", default="redis://cache:6379/0"))
+        return self.connection
+
+    def register(self, metric: "Metric"):
+        self.metrics[metric.name] = metric
+
+    def add(self, values: dict[str, float]):
+        with self.lock:
+            for field, value in values.items():
+                self.pending[field] = self.pending.get(field, 0) + value
+            should_flush = time.monotonic() - self.last_flush >= FLUSH_INTERVAL
+            if should_flush:
+                self.last_flush = time.monotonic()  # under the lock: one flush thread per interval
+
+        if should_flush:
+            # off the caller's thread: don't add latency to the request or block an event loop
+            threading.Thread(target=self.flush, daemon=True).start()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+
+        if not pending:
+            return
+
+        try:
+            pipeline = self._get_connection().pipeline(transaction=False)
+            for field, value in pending.items():
+                pipeline.hincrbyfloat(METRICS_KEY, field, value)
+            pipeline.execute()
+        except redis.RedisError as error:
+            print(f"Metrics are not flushed: {error}")
+            # keep the values for the next flush
+            with self.lock:
+                for field, value in pending.items():
+                    self.pending[field] = self.pending.get(field, 0) + value
+
+    def collect(self) -> dict[str, float]:
+        """Totals of all processes."""
+
+        self.flush()
+
+        return {field.decode(): float(value) for field, value in self._get_connection().hgetall(METRICS_KEY).items()}
+
+    def render(self) -> str:
+        """Prometheus text format."""
+
+        values = self.collect()
+        lines: list[str] = []
+
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for field, value in sorted(values.items()):
+                if field.partition("{")[0] in metric.series_names():
+                    lines.append(f"{field} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+
+def _escape(value: str) -> str:
+    """Label value in the exposition format: backslash, double quote and newline are escaped."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    type: str = ""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        REGISTRY.register(self)
+
+    def series_names(self) -> tuple[str, ...]:
+        return (self.name,)
+
+    def _field(self, name: str, labels: dict[str, str], **extra: str) -> str:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Metric {self.name} expects labels {self.labels}, got {tuple(labels)}")
+
+        pairs = [f'{label}="{_escape(labels[label])}"' for label in self.labels]
+        pairs += [f'{label}="{_escape(value)}"' for label, value in extra.items()]
+
+        return f"{name}{{{','.join(pairs)}}}" if pairs else name
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, value: float = 1, **labels: str):
+        REGISTRY.add({self._field(self.name, labels): value})
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def series_names(self) -> tuple[str, ...]:
+        return f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count"
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Observe duration of the block in seconds:
+
+        with PROVIDER_LATENCY.time(provider="silpo", operation="create_order"):
+            ...
+        """
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def observe(self, value: float, **labels: str):
+        # buckets are cumulative: the value is counted in every bucket it fits into
+        values = {
+            self._field(f"{self.name}_bucket", labels, le=f"{bucket:g}"): 1
+            for bucket in self.buckets
+            if value <= bucket
+        }
+        values[self._field(f"{self.name}_bucket", labels, le="+Inf")] = 1
+        values[self._field(f"{self.name}_sum", labels)] = value
+        values[self._field(f"{self.name}_count", labels)] = 1
+
+        REGISTRY.add(values)
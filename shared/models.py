@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class OutboxMessage(models.Model):
+    """Celery task waiting to be published by `relay_outbox` (see shared/outbox.py)."""
+
+    class Meta:
+        db_table = "outbox"
+
+    task = models.CharField(max_length=255)  # registered task name
+    queue = models.CharField(max_length=100)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.task} [{self.pk}]"
@@ -0,0 +1,109 @@
+"""
+Transactional outbox for Celery tasks.
+
+    with transaction.atomic():
+        order = Order.objects.create(...)
+        enqueue(order_in_silpo, order.pk, item_ids)  # INSERT INTO outbox, the same transaction
+
+    python manage.py relay_outbox  # SELECT ... FOR UPDATE SKIP LOCKED -> publish the batch -> DELETE
+
+The task is stored with the data it is about, so it is neither lost on broker
+outages nor published for rolled back data. The relay publishes batches
+over one broker connection. Arguments must be JSON serializable (ids, not model instances).
+
+Delivery is at least once: if the relay fails in the middle of the batch (or its commit fails),
+the batch is published again. Messages have a stable task id (outbox-<id>), and tasks with
+`base=OutboxTask` skip it if it was already started (SET NX outbox:<task id>), so a duplicate
+doesn't place a second provider order. The flip side: a started task is not run again
+if the worker dies in the middle of it.
+
+With CELERY_TASK_ALWAYS_EAGER there is no relay: the task is run on commit.
+"""
+
+from functools import partial
+import time
+
+from celery import Task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from config import celery_app
+
+from .cache import CacheService
+from .metrics import Counter, Histogram
+from .models import OutboxMessage
+
+OUTBOX_PUBLISHED = Counter("outbox_published_total", "Tasks published from the outbox", labels=("queue",))
+OUTBOX_DUPLICATES = Counter("outbox_duplicates_total", "Republished outbox tasks that are skipped", labels=("task",))
+OUTBOX_DELAY = Histogram(
+    "outbox_delay_seconds", "Time from the outbox insert to the publishing", buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+
+class OutboxTask(Task):
+    """Base class of side-effecting tasks published with `enqueue`: a republished message is run once."""
+
+    def __call__(self, *args, **kwargs):
+        task_id: str | None = self.request.id
+        if task_id and task_id.startswith("outbox-"):
+            is_new = CacheService().add(
+                namespace="outbox", key=task_id, value={"task": self.name}, ttl=settings.OUTBOX_DEDUPLICATION_TIME
+            )
+            if not is_new:
+                print(f"Duplicated task {self.name} is skipped: {task_id}")
+                OUTBOX_DUPLICATES.inc(task=self.name)
+                return None
+
+        return super().__call__(*args, **kwargs)
+
+
+def enqueue(task: Task, *args, **kwargs):
+    if celery_app.conf.task_always_eager:
+        transaction.on_commit(partial(task.delay, *args, **kwargs))
+        return
+
+    OutboxMessage.objects.create(
+        task=task.name,
+        queue=getattr(task, "queue", None) or "default",
+        args=list(args),
+        kwargs=kwargs,
+    )
+
+
+def relay(batch_size: int) -> int:
+    """Publish one batch of messages. Return number of published messages."""
+
+    with transaction.atomic():
+        # SKIP LOCKED: several relays work on different batches
+        messages = list(OutboxMessage.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size])
+        if not messages:
+            return 0
+
+        now = timezone.now()
+        with celery_app.producer_or_acquire() as producer:
+            for message in messages:
+                celery_app.send_task(
+                    message.task,
+                    args=message.args,
+                    kwargs=message.kwargs,
+                    queue=message.queue,
+                    task_id=f"outbox-{message.pk}",
+                    producer=producer,
+                )
+                OUTBOX_PUBLISHED.inc(queue=message.queue)
+                OUTBOX_DELAY.observe((now - message.created_at).total_seconds())
+
+        OutboxMessage.objects.filter(id__in=[message.pk for message in messages]).delete()
+
+    return len(messages)
+
+
+def run_relay(batch_size: int, interval: float, once: bool = False):
+    while True:
+        while relay(batch_size) == batch_size:
+            pass  # backlog: don't wait for the next poll
+
+        if once:
+            return
+        time.sleep(interval)
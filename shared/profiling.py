@@ -0,0 +1,163 @@
+"""
+Per-request profiling: SQL queries, cache operations and wall time per endpoint.
+
+Opt-in, enabled with DJANGO_PROFILING=1 and applied to the PROFILING_SAMPLE_RATE
+share of requests. Results are exported as metrics (GET /metrics/):
+
+    request_seconds{endpoint="food/orders/"}
+    request_queries{endpoint="food/orders/"}
+    request_sql_seconds{endpoint="food/orders/"}
+    request_cache_operations{endpoint="food/orders/"}
+    requests_over_budget_total{endpoint="food/orders/",budget="queries"}
+
+Requests over PROFILING_*_BUDGET are also printed, so N+1 regressions
+are visible in the logs of staging and production.
+
+NOTES
+    SQL is captured with `execute_wrapper` of every database connection in the request thread.
+    Async views run ORM calls in other threads (sync_to_async), so only their
+    cache operations and wall time are profiled.
+"""
+
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import LATENCY_BUCKETS, Counter, Histogram
+
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+REQUEST_LATENCY = Histogram("request_seconds", "Profiled requests wall time", labels=("endpoint",))
+REQUEST_QUERIES = Histogram(
+    "request_queries", "SQL queries per profiled request", labels=("endpoint",), buckets=COUNT_BUCKETS
+)
+REQUEST_SQL_TIME = Histogram(
+    "request_sql_seconds", "SQL time per profiled request", labels=("endpoint",), buckets=LATENCY_BUCKETS
+)
+REQUEST_CACHE_OPERATIONS = Histogram(
+    "request_cache_operations", "Cache operations per profiled request", labels=("endpoint",), buckets=COUNT_BUCKETS
+)
+REQUESTS_OVER_BUDGET = Counter(
+    "requests_over_budget_total", "Profiled requests over the budget", labels=("endpoint", "budget")
+)
+
+
+@dataclass
+class RequestProfile:
+    queries: int = 0
+    sql_time: float = 0
+    cache_operations: int = 0
+    cache_time: float = 0
+
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar("current_profile", default=None)
+
+
+def record_cache_operation(elapsed: float):
+    """Called by CacheService for every Redis operation."""
+
+    profile = current_profile.get()
+    if profile is not None:
+        profile.cache_operations += 1
+        profile.cache_time += elapsed
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.sample_rate: float = settings.PROFILING_SAMPLE_RATE
+        self.budgets: dict[str, float] = {
+            "queries": settings.PROFILING_QUERY_BUDGET,
+            "sql_time": settings.PROFILING_SQL_TIME_BUDGET,
+            "time": settings.PROFILING_TIME_BUDGET,
+        }
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                # every alias: reads could be routed to the replicas (shared/db.py)
+                for alias in settings.DATABASES:
+                    stack.enter_context(connections[alias].execute_wrapper(self._execute(profile)))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+
+        self._report(request, profile, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+
+        self._report(request, profile, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def _execute(profile: RequestProfile):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                profile.queries += 1
+                profile.sql_time += time.perf_counter() - started
+
+        return wrapper
+
+    def _report(self, request, profile: RequestProfile, elapsed: float):
+        # route pattern, not the path: /food/orders/17 and /food/orders/18 are one endpoint
+        match = request.resolver_match
+        endpoint = match.route if match is not None else "unresolved"
+
+        REQUEST_LATENCY.observe(elapsed, endpoint=endpoint)
+        REQUEST_QUERIES.observe(profile.queries, endpoint=endpoint)
+        REQUEST_SQL_TIME.observe(profile.sql_time, endpoint=endpoint)
+        REQUEST_CACHE_OPERATIONS.observe(profile.cache_operations, endpoint=endpoint)
+
+        actual = {"queries": profile.queries, "sql_time": profile.sql_time, "time": elapsed}
+        exceeded = [budget for budget, limit in self.budgets.items() if limit and actual[budget] > limit]
+        if not exceeded:
+            return
+
+        for budget in exceeded:
+            REQUESTS_OVER_BUDGET.inc(endpoint=endpoint, budget=budget)
+
+        print(
+            f"⚠️ {request.method} {request.path} is over the budget ({', '.join(exceeded)}): "
+            f"{profile.queries} queries, SQL {profile.sql_time * 1000:.1f} ms, "
+            f"{profile.cache_operations} cache operations, cache {profile.cache_time * 1000:.1f} ms, "
+            f"total {elapsed * 1000:.1f} ms"
+        )
@@ -0,0 +1,106 @@
+"""
+Celery tasks instrumentation (exported on GET /metrics/).
+
+    publish --(queue wait)--> prerun --(runtime: work + blocked)--> postrun
+
+    task_queue_wait_seconds{task,queue}     - from publishing to the start in the worker
+    task_runtime_seconds{task,queue}        - execution time
+    task_blocked_seconds_total{task,queue,kind}
+                                            - time the worker slot spent in `wait()` (kind="sleep")
+                                              or in provider requests (kind="io")
+    tasks_processed_total{task,queue,state} - per queue throughput
+
+    sum(task_blocked_seconds_total) / sum(task_runtime_seconds_sum)
+        - share of workers capacity which is not used for the work
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+import time
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+
+from .metrics import LATENCY_BUCKETS, Counter, Histogram
+
+PUBLISHED_AT_HEADER = "published_at"
+TASK_BUCKETS = LATENCY_BUCKETS + (30, 60, 120, 300, 600)
+
+TASK_QUEUE_WAIT = Histogram(
+    "task_queue_wait_seconds", "Time from publishing to the task start", labels=("task", "queue"), buckets=TASK_BUCKETS
+)
+TASK_RUNTIME = Histogram(
+    "task_runtime_seconds", "Task execution time", labels=("task", "queue"), buckets=TASK_BUCKETS
+)
+TASK_BLOCKED = Counter(
+    "task_blocked_seconds_total", "Task time spent sleeping or waiting for I/O", labels=("task", "queue", "kind")
+)
+TASKS_PROCESSED = Counter("tasks_processed_total", "Finished tasks", labels=("task", "queue", "state"))
+
+
+@dataclass
+class TaskRun:
+    task: str
+    queue: str
+    started: float = field(default_factory=time.perf_counter)
+    blocked: dict[str, float] = field(default_factory=dict)
+    token: Token | None = None
+
+
+# set for the duration of the task, in the thread (or process) executing it
+current_run: ContextVar[TaskRun | None] = ContextVar("current_run", default=None)
+
+
+@contextmanager
+def blocked(kind: str):
+    """Account the block as blocked time of the current task (if any)."""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        run = current_run.get()
+        if run is not None:
+            run.blocked[kind] = run.blocked.get(kind, 0) + time.perf_counter() - started
+
+
+def wait(seconds: float):
+    """`time.sleep` which is reported as the blocked time of the task."""
+
+    with blocked("sleep"):
+        time.sleep(seconds)
+
+
+def _queue(task) -> str:
+    delivery_info = task.request.delivery_info or {}
+    return delivery_info.get("routing_key") or getattr(task, "queue", None) or "default"
+
+
+@before_task_publish.connect
+def on_before_task_publish(headers: dict | None = None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def on_task_prerun(task=None, **kwargs):
+    run = TaskRun(task=task.name, queue=_queue(task))
+    run.token = current_run.set(run)  # eager subtasks are nested into the caller run
+
+    # not set for eager tasks, they are not published
+    published_at: float | None = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    if published_at is not None:
+        TASK_QUEUE_WAIT.observe(max(time.time() - published_at, 0), task=run.task, queue=run.queue)
+
+
+@task_postrun.connect
+def on_task_postrun(task=None, state: str | None = None, **kwargs):
+    run = current_run.get()
+    if run is None:
+        return
+    current_run.reset(run.token)
+
+    TASK_RUNTIME.observe(time.perf_counter() - run.started, task=run.task, queue=run.queue)
+    TASKS_PROCESSED.inc(task=run.task, queue=run.queue, state=state or "UNKNOWN")
+    for kind, seconds in run.blocked.items():
+        TASK_BLOCKED.inc(seconds, task=run.task, queue=run.queue, kind=kind)
@@ -0,0 +1,245 @@
+from unittest import mock, skipUnless
+import asyncio
+import uuid
+
+import redis
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import celery_app
+
+from .cache import CacheService, _async_connection_pools, _get_async_connection_pool
+from . import metrics
+from .db import ReplicaRoutingMiddleware, use_replica
+from .codecs import Codec, JSONCodec, MsgpackCodec, ORJSONCodec, decode, get_codec, msgpack, orjson
+from .outbox import OutboxTask
+from .views import metrics as metrics_view
+
+VALUE = {"restaurants": {"1": {"status": "cooking", "external_id": None}}, "delivery": {"location": [1.5, 2]}}
+
+
+def redis_available() -> bool:
+    try:
+        CacheService().connection.ping()
+    except redis.RedisError:
+        return False
+    return True
+
+
+class CodecsTests(SimpleTestCase):
+
+    def assertRoundTrip(self, codec_name: str, compress_min_size: int = 0):
+        codec = get_codec(codec_name, compress_min_size=compress_min_size)
+        self.assertEqual(decode(codec.encode(VALUE)), VALUE)
+
+    def test_json(self):
+        self.assertRoundTrip("json")
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_orjson(self):
+        self.assertRoundTrip("orjson")
+        self.assertRoundTrip("orjson", compress_min_size=1)
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack(self):
+        self.assertRoundTrip("msgpack")
+        self.assertRoundTrip("msgpack", compress_min_size=1)
+
+    def test_legacy_json_is_readable(self):
+        self.assertEqual(decode(b'{"user_id": 3}'), {"user_id": 3})
+
+    def test_json_writes_legacy_format(self):
+        self.assertEqual(JSONCodec().encode({"id": 1}), b'{"id": 1}')
+
+    def test_version_bytes(self):
+        self.assertEqual(ORJSONCodec.version, 0x01)
+        self.assertEqual(MsgpackCodec.version, 0x02)
+
+    @mock.patch("shared.codecs.orjson", None)
+    def test_missing_package(self):
+        with self.assertRaises(RuntimeError):
+            get_codec("orjson").encode(VALUE)
+
+    def test_codec_must_implement_dumps_and_loads(self):
+        with self.assertRaises(TypeError):
+            Codec()
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            get_codec("pickle")
+
+
+@mock.patch("shared.cache.redis.asyncio.ConnectionPool.from_url", return_value=mock.AsyncMock())
+class AsyncConnectionPoolTests(SimpleTestCase):
+
+    def test_pool_is_closed_with_its_loop(self, from_url):
+        async def get_pool():
+            self.assertIs(_get_async_connection_pool(), _get_async_connection_pool())
+
+        asyncio.run(get_pool())
+        asyncio.run(get_pool())
+
+        self.assertEqual(from_url.return_value.aclose.await_count, 2)
+        self.assertEqual(len(_async_connection_pools), 0)
+
+
+@skipUnless(redis_available(), "Redis is not available")
+class RateLimitScriptsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = CacheService()
+        self.key = uuid.uuid4().hex
+
+    def tearDown(self):
+        self.cache.delete(namespace="tests", key=self.key)
+
+    def test_token_bucket(self):
+        results = [self.cache.take_token("tests", self.key, capacity=3, period=60) for _ in range(4)]
+
+        self.assertEqual(results[:3], [0, 0, 0])
+        # one token is refilled in 20 seconds
+        self.assertGreater(results[3], 0)
+        self.assertLessEqual(results[3], 20)
+
+    def test_sliding_window(self):
+        results = [self.cache.hit_sliding_window("tests", self.key, limit=2, window=60) for _ in range(3)]
+
+        self.assertEqual(results[:2], [0, 0])
+        self.assertGreater(results[2], 0)
+        self.assertLessEqual(results[2], 60)
+
+    def test_sliding_window_rejected_hits_are_not_counted(self):
+        for _ in range(5):
+            self.cache.hit_sliding_window("tests", self.key, limit=2, window=60)
+
+        self.assertEqual(self.cache.connection.zcard(f"tests:{self.key}"), 2)
+
+
+side_effect = mock.Mock()
+
+
+@celery_app.task(base=OutboxTask)
+def place_order(order_id: int):
+    side_effect(order_id)
+    return order_id
+
+
+@skipUnless(redis_available(), "Redis is not available")
+class OutboxTaskTests(SimpleTestCase):
+
+    def setUp(self):
+        side_effect.reset_mock()
+        self.task_id = f"outbox-{uuid.uuid4().hex}"
+        self.addCleanup(CacheService().delete, namespace="outbox", key=self.task_id)
+
+    def test_republished_task_is_run_once(self):
+        first = place_order.apply(args=(1,), task_id=self.task_id)
+        second = place_order.apply(args=(1,), task_id=self.task_id)
+
+        self.assertEqual((first.result, second.result), (1, None))
+        side_effect.assert_called_once_with(1)
+
+    def test_tasks_not_from_outbox_are_not_checked(self):
+        place_order.apply(args=(1,))
+        place_order.apply(args=(1,))
+
+        self.assertEqual(side_effect.call_count, 2)
+
+
+class RegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.registry.last_flush -= metrics.FLUSH_INTERVAL
+
+    @mock.patch("shared.metrics.threading.Thread")
+    def test_one_flush_per_interval(self, thread):
+        for _ in range(10):
+            self.registry.add({"requests_total": 1})
+
+        thread.assert_called_once()
+        self.assertEqual(self.registry.pending, {"requests_total": 10})
+
+    def test_failed_flush_keeps_values(self):
+        self.registry.connection = mock.Mock()
+        self.registry.connection.pipeline.return_value.execute.side_effect = redis.ConnectionError("no Redis")
+        self.registry.pending = {"requests_total": 2}
+
+        self.registry.flush()
+        self.registry.add({"requests_total": 1})
+
+        self.assertEqual(self.registry.pending, {"requests_total": 3})
+
+    @mock.patch.object(metrics.REGISTRY, "register")
+    def test_label_values_are_escaped(self, _):
+        counter = metrics.Counter("requests_total", "Requests", labels=("path",))
+
+        self.assertEqual(
+            counter._field("requests_total", {"path": 'a\\b"c\nd'}),
+            'requests_total{path="a\\\\b\\"c\\nd"}',
+        )
+
+
+@skipUnless(redis_available(), "Redis is not available")
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaStickinessTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+        self.user_id = uuid.uuid4().int % 10**9
+        self.addCleanup(CacheService().delete, namespace="primary_until", key=str(self.user_id))
+
+    @staticmethod
+    def view(request):
+        return HttpResponse(str(use_replica.get()))
+
+    def bearer(self, user_id: int) -> dict:
+        token = AccessToken()
+        token["user_id"] = user_id
+        return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def reads_replica(self, **headers) -> bool:
+        return self.middleware(self.factory.get("/food/orders/", **headers)).content == b"True"
+
+    def test_reads_after_write_use_primary_for_the_user(self):
+        self.assertTrue(self.reads_replica(**self.bearer(self.user_id)))
+
+        self.middleware(self.factory.post("/food/orders/", **self.bearer(self.user_id)))
+
+        self.assertFalse(self.reads_replica(**self.bearer(self.user_id)))
+        self.assertTrue(self.reads_replica(**self.bearer(self.user_id + 1)))
+
+    def test_cookie_fallback_for_anonymous_clients(self):
+        response = self.middleware(self.factory.post("/users/"))
+        self.factory.cookies = response.cookies
+
+        self.assertFalse(self.reads_replica())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_not_used_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaRoutingMiddleware(self.view)
+
+
+@mock.patch("shared.views.REGISTRY.render", return_value="requests_total 1\n")
+class MetricsViewTests(SimpleTestCase):
+
+    def get(self, **headers) -> int:
+        return metrics_view(RequestFactory().get("/metrics/", **headers)).status_code
+
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_closed_without_token(self, _):
+        self.assertEqual(self.get(), 403)
+
+    @override_settings(METRICS_TOKEN="", DEBUG=True)
+    def test_open_in_debug_without_token(self, _):
+        self.assertEqual(self.get(), 200)
+
+    @override_settings(METRICS_TOKEN="secret", DEBUG=True)
+    def test_token_is_required(self, _):
+        self.assertEqual(self.get(), 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION="Bearer wrong"), 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION="Bearer secret"), 200)
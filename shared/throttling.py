@@ -0,0 +1,85 @@
+"""
+API throttling in Redis, shared by all web processes.
+
+    THROTTLES = {
+        "orders": {
+            "algorithm": "token_bucket",  # bursts up to the limit, then the limit per period
+            "rates": {"customer": "20/min", "admin": None, "*": "10/min"},
+        },
+        "auth": {"algorithm": "sliding_window", "rates": {"*": "10/min"}},
+    }
+
+Views opt in with `throttle_scope`. The rate is selected by the role of the user
+("anonymous" for not authenticated clients, "*" for not listed roles; None - no limit),
+authenticated clients are counted by user id, anonymous ones by IP.
+
+    token_bucket   - CacheService.take_token: smooth refill, allows short bursts
+    sliding_window - CacheService.hit_sliding_window: strict limit, for expensive endpoints
+
+If Redis is unavailable requests are not throttled: the limits protect the API, not guard it.
+"""
+
+import redis
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import CacheService
+from .metrics import Counter
+
+THROTTLED_REQUESTS = Counter("throttled_requests_total", "Requests rejected by throttling", labels=("scope", "role"))
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 60 * 60, "hour": 60 * 60, "d": 60 * 60 * 24, "day": 60 * 60 * 24}
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """'10/min' -> (10, 60)"""
+
+    limit, _, period = rate.partition("/")
+    return int(limit), PERIODS[period]
+
+
+class RedisThrottle(BaseThrottle):
+
+    def __init__(self):
+        self.retry_after: float | None = None
+
+    @staticmethod
+    def get_role(request) -> str:
+        if not request.user or not request.user.is_authenticated:
+            return "anonymous"
+        return getattr(request.user, "role", "*")
+
+    def allow_request(self, request, view) -> bool:
+        scope = getattr(view, "throttle_scope", None)
+        config: dict | None = settings.THROTTLES.get(scope)
+        if config is None:
+            return True
+
+        role = self.get_role(request)
+        rate: str | None = config["rates"].get(role, config["rates"].get("*"))
+        if rate is None:
+            return True
+
+        limit, period = parse_rate(rate)
+        ident = f"user:{request.user.pk}" if role != "anonymous" else f"ip:{self.get_ident(request)}"
+        cache = CacheService()
+
+        try:
+            match config["algorithm"]:
+                case "token_bucket":
+                    self.retry_after = cache.take_token("throttle", f"{scope}:{ident}", capacity=limit, period=period)
+                case "sliding_window":
+                    self.retry_after = cache.hit_sliding_window("throttle", f"{scope}:{ident}", limit=limit, window=period)
+                case algorithm:
+                    raise ValueError(f"Throttling algorithm {algorithm} is not supported. Available: token_bucket, sliding_window")
+        except redis.RedisError as error:
+            print(f"⚠️ Requests are not throttled: {error}")
+            return True
+
+        if self.retry_after:
+            THROTTLED_REQUESTS.inc(scope=scope, role=role)
+            return False
+        return True
+
+    def wait(self) -> float | None:
+        return self.retry_after
@@ -0,0 +1,21 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .metrics import REGISTRY
+
+
+def metrics(request):
+    """Prometheus scrape endpoint. Protected with `Authorization: Bearer <METRICS_TOKEN>`.
+
+    Without the token it is closed, unless DEBUG is on (local development).
+    """
+
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+        return HttpResponseForbidden()
+
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4")
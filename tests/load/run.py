@@ -0,0 +1,314 @@
+"""
+Load test of the orders pipeline through the real stack.
+
+    make docker  # database, cache and broker
+    python -m tests.load.run --orders 1000 --concurrency 100 --mode worker
+
+Starts the provider mocks, the API (uvicorn) and, in worker mode, Celery workers.
+Creates orders with POST /food/orders/ and waits until all of them are finished.
+
+    eager  - CELERY_TASK_ALWAYS_EAGER, orders are processed inside the API requests
+    worker - orders are processed by the workers (a worker per queue)
+
+Report:
+    throughput         - created and finished orders per second
+    time to delivered  - p50/p95/p99, from OrderStatusHistory (one clock for all orders)
+    worker utilization - from tasks metrics (shared/task_metrics.py):
+                         busy = runtime - time blocked in sleeps and provider requests
+
+Mocks latency and errors are configured with environment variables,
+see tests/providers/behaviour.py and tests/providers/engine.py.
+If a mock tick lag grows, the mock is the bottleneck, not the API:
+
+    KFC_STEP_DELAY=lognormal:1.5:0.3 UBER_ERROR_RATE=0.01 python -m tests.load.run ...
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+import django
+import httpx
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from food.models import Dish, Order, OrderStatusHistory  # noqa: E402
+from food.enums import OrderStatus  # noqa: E402
+from food.transitions import FINAL_STATUSES  # noqa: E402
+from shared.metrics import FLUSH_INTERVAL, REGISTRY  # noqa: E402
+from users.models import Role, User  # noqa: E402
+
+MOCKS: dict[str, int] = {"silpo": 8001, "kfc": 8002, "uklon": 8003, "uber": 8004}
+WORKER_QUEUES = ("default", "high_priority", "low_priority", "webhooks")
+
+USER_EMAIL = "load-test@catering.local"
+USER_PASSWORD = "load-test"
+
+
+class Stack:
+    """Local processes of the system under the test."""
+
+    def __init__(self, mode: str, api_port: int, api_workers: int, worker_concurrency: int, mocks: bool):
+        self.mode = mode
+        self.api_port = api_port
+        self.api_workers = api_workers
+        self.worker_concurrency = worker_concurrency
+        self.mocks = mocks
+        self.processes: list[subprocess.Popen] = []
+
+    @property
+    def worker_slots(self) -> int | None:
+        return len(WORKER_QUEUES) * self.worker_concurrency if self.mode == "worker" else None
+
+    def _spawn(self, *command: str, env: dict[str, str] | None = None):
+        self.processes.append(subprocess.Popen([sys.executable, "-m", *command], env=env or os.environ.copy()))
+
+    def start(self):
+        ports = [self.api_port]
+
+        if self.mocks:
+            for name, port in MOCKS.items():
+                self._spawn("uvicorn", f"tests.providers.{name}:app", "--port", str(port), "--log-level", "warning")
+                ports.append(port)
+
+        env = os.environ.copy()
+        env["CELERY_TASK_ALWAYS_EAGER"] = "1" if self.mode == "eager" else ""
+        self._spawn(
+            "uvicorn", "config.asgi:application",
+            "--port", str(self.api_port),
+            "--workers", str(self.api_workers),
+            "--log-level", "warning",
+            env=env,
+        )
+
+        if self.mode == "worker":
+            self._spawn("django", "relay_outbox", env=env)  # tasks are published from the outbox
+            for queue in WORKER_QUEUES:
+                self._spawn(
+                    "celery", "-A", "config", "worker", "-l", "WARNING", "-Q", queue, "-n", f"load-{queue}@%h",
+                    "--pool=threads", f"--concurrency={self.worker_concurrency}",
+                    env=env,
+                )
+
+        for port in ports:
+            wait_for_port(port)
+
+    def stop(self):
+        # SIGTERM: workers and API flush their metrics on exit
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait(timeout=30)
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://localhost:{port}/", timeout=1)
+        except httpx.TransportError:
+            time.sleep(0.2)
+        else:
+            return
+
+    raise RuntimeError(f"Nothing is listening on the port {port} after {timeout} seconds")
+
+
+def prepare_order_body(delivery_provider: str) -> dict:
+    """An order with a dish from every restaurant (Silpo and KFC)."""
+
+    items = []
+    for restaurant in ("silpo", "kfc"):
+        dish = Dish.objects.filter(restaurant__name__iexact=restaurant).first()
+        if dish is None:
+            raise RuntimeError(f"No dishes of {restaurant}, load fixtures first: python manage.py loaddata dump")
+        items.append({"dish": dish.pk, "quantity": 1})
+
+    return {
+        "items": items,
+        "eta": str(date.today() + timedelta(days=1)),
+        "delivery_provider": delivery_provider,
+    }
+
+
+def prepare_user() -> None:
+    """All orders are created by one user: the admin role is not throttled (see THROTTLES["orders"])."""
+
+    if not User.objects.filter(email=USER_EMAIL).exists():
+        User.objects.create_user(email=USER_EMAIL, password=USER_PASSWORD, phone_number="0000000000")
+    User.objects.filter(email=USER_EMAIL).update(is_active=True, role=Role.ADMIN)
+
+
+async def create_orders(
+    base_url: str, body: dict, orders: int, concurrency: int
+) -> tuple[list[int], list[float], int, int]:
+    """Return created order ids, POST latencies, number of failed and throttled (429) requests."""
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None) as client:
+        response = await client.post("/auth/token/", json={"email": USER_EMAIL, "password": USER_PASSWORD})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access']}"
+
+        semaphore = asyncio.Semaphore(concurrency)
+        order_ids: list[int] = []
+        latencies: list[float] = []
+        errors = 0
+        throttled = 0
+
+        async def create():
+            nonlocal errors, throttled
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/food/orders/", json=body)
+                    if response.status_code == 429:
+                        throttled += 1
+                        return
+                    response.raise_for_status()
+                except httpx.HTTPError as error:
+                    errors += 1
+                    print(f"Order is not created: {error}")
+                else:
+                    order_ids.append(response.json()["id"])
+                    latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(create() for _ in range(orders)))
+
+    return order_ids, latencies, errors, throttled
+
+
+def wait_finished(order_ids: list[int], timeout: float) -> set[int]:
+    """Wait until orders reach final statuses. Return ids of unfinished ones."""
+
+    pending = set(order_ids)
+    deadline = time.monotonic() + timeout
+
+    while pending and time.monotonic() < deadline:
+        finished = Order.objects.filter(id__in=pending, status__in=FINAL_STATUSES).values_list("id", flat=True)
+        pending.difference_update(finished)
+        print(f"⏳ {len(order_ids) - len(pending)}/{len(order_ids)} orders are finished")
+        if pending:
+            time.sleep(1)
+
+    return pending
+
+
+def time_to_delivered(order_ids: list[int]) -> tuple[list[float], dict[str, int]]:
+    """Return seconds from creation to delivery and the number of orders per final status."""
+
+    created: dict[int, float] = {}
+    delivered: dict[int, float] = {}
+    statuses: dict[str, int] = {}
+
+    history = OrderStatusHistory.objects.filter(order_id__in=order_ids).values_list("order_id", "status", "created_at")
+    for order_id, status, created_at in history.order_by("created_at").iterator():
+        created.setdefault(order_id, created_at.timestamp())
+        if status == OrderStatus.DELIVERED:
+            delivered[order_id] = created_at.timestamp()
+        if status in FINAL_STATUSES:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    return [delivered[order_id] - created[order_id] for order_id in delivered], statuses
+
+
+def mocks_stats() -> dict[str, dict]:
+    """Mocks ticker lag and webhooks counters, see tests/providers/engine.py."""
+
+    results = {}
+    for name, port in MOCKS.items():
+        try:
+            results[name] = httpx.get(f"http://localhost:{port}/mock/stats", timeout=5).json()
+        except httpx.HTTPError as error:
+            print(f"No stats of {name} mock: {error}")
+
+    return results
+
+
+def percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return float("nan")
+
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+def tasks_time() -> tuple[float, float]:
+    """Total runtime and blocked seconds of all tasks so far."""
+
+    values = REGISTRY.collect()
+    runtime = sum(value for field, value in values.items() if field.startswith("task_runtime_seconds_sum"))
+    blocked = sum(value for field, value in values.items() if field.startswith("task_blocked_seconds_total"))
+
+    return runtime, blocked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orders pipeline load test")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="concurrent POST /food/orders/ requests")
+    parser.add_argument("--mode", choices=("eager", "worker"), default="worker")
+    parser.add_argument("--delivery-provider", choices=("uklon", "uber"), default="uber")
+    parser.add_argument("--api-port", type=int, default=8000)
+    parser.add_argument("--api-workers", type=int, default=4)
+    parser.add_argument("--worker-concurrency", type=int, default=50, help="threads per worker (queue)")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for orders to finish")
+    parser.add_argument("--no-mocks", action="store_true", help="providers are already running")
+    parser.add_argument("--no-stack", action="store_true", help="API and workers are already running")
+    args = parser.parse_args()
+
+    prepare_user()
+    body = prepare_order_body(args.delivery_provider)
+
+    stack = Stack(args.mode, args.api_port, args.api_workers, args.worker_concurrency, mocks=not args.no_mocks)
+    if not args.no_stack:
+        stack.start()
+
+    runtime_before, blocked_before = tasks_time()
+    started = time.perf_counter()
+    try:
+        order_ids, latencies, errors, throttled = asyncio.run(
+            create_orders(f"http://localhost:{args.api_port}", body, args.orders, args.concurrency)
+        )
+        created_in = time.perf_counter() - started
+        unfinished = wait_finished(order_ids, args.timeout)
+        finished_in = time.perf_counter() - started
+        mocks = mocks_stats()
+    finally:
+        if not args.no_stack:
+            stack.stop()
+        else:
+            time.sleep(FLUSH_INTERVAL + 1)  # let workers flush their metrics
+
+    durations, statuses = time_to_delivered(order_ids)
+    runtime_after, blocked_after = tasks_time()
+    runtime, blocked = runtime_after - runtime_before, blocked_after - blocked_before
+
+    print()
+    print(f"Orders:             {len(order_ids)} created, {errors} failed, {throttled} throttled, "
+          f"{len(unfinished)} unfinished")
+    print(f"Final statuses:     {', '.join(f'{status}={count}' for status, count in sorted(statuses.items()))}")
+    print(f"Throughput:         {len(order_ids) / created_in:.1f} created/s, "
+          f"{(len(order_ids) - len(unfinished)) / finished_in:.1f} finished/s")
+    print(f"POST latency:       p50={percentile(latencies, 50) * 1000:.0f} ms, "
+          f"p95={percentile(latencies, 95) * 1000:.0f} ms, p99={percentile(latencies, 99) * 1000:.0f} ms")
+    print(f"Time to delivered:  p50={percentile(durations, 50):.1f} s, "
+          f"p95={percentile(durations, 95):.1f} s, p99={percentile(durations, 99):.1f} s")
+    print(f"Tasks time:         {runtime:.0f} s, blocked {blocked:.0f} s "
+          f"({blocked / runtime * 100 if runtime else 0:.0f}%), busy {runtime - blocked:.0f} s")
+    for name, stats in mocks.items():
+        webhooks = stats["webhooks"] or {}
+        print(f"Mock {name + ':':<13} max tick lag {stats['max_tick_lag']:.2f} s, "
+              f"webhooks failed {webhooks.get('failed', 0)}, dropped {webhooks.get('dropped', 0)}")
+    if stack.worker_slots and not args.no_stack:
+        print(f"Worker utilization: {runtime / (stack.worker_slots * finished_in) * 100:.1f}% of "
+              f"{stack.worker_slots} slots occupied, {(runtime - blocked) / (stack.worker_slots * finished_in) * 100:.1f}% busy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Configurable behaviour of the provider mocks (for load tests).
+
+Every mock reads <PREFIX>_* environment variables, e.g. for KFC:
+
+    KFC_STEP_DELAY=uniform:4:6     # time between order status changes, seconds
+    KFC_LATENCY=lognormal:-3:0.5   # API response latency, seconds
+    KFC_ERROR_RATE=0.01            # share of API requests answered with 503
+
+Distributions:
+
+    fixed:<seconds>
+    uniform:<min>:<max>
+    normal:<mean>:<stddev>
+    lognormal:<mu>:<sigma>         # long tail, typical for the real APIs
+    exponential:<mean>
+
+Defaults keep the original mocks timings.
+"""
+
+import asyncio
+import os
+import random
+from dataclasses import dataclass
+from typing import Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DISTRIBUTIONS: dict[str, Callable[..., float]] = {
+    "fixed": lambda value: value,
+    "uniform": random.uniform,
+    "normal": random.gauss,
+    "lognormal": random.lognormvariate,
+    "exponential": lambda mean: random.expovariate(1 / mean),
+}
+
+
+@dataclass
+class Distribution:
+    name: str
+    parameters: tuple[float, ...]
+
+    @classmethod
+    def parse(cls, spec: str) -> "Distribution":
+        name, *parameters = spec.split(":")
+        if name not in DISTRIBUTIONS:
+            raise ValueError(f"Distribution {name} is not supported. Available: {', '.join(DISTRIBUTIONS)}")
+
+        return cls(name=name, parameters=tuple(float(parameter) for parameter in parameters))
+
+    def sample(self) -> float:
+        return max(DISTRIBUTIONS[self.name](*self.parameters), 0)
+
+
+@dataclass
+class Behaviour:
+    step_delay: Distribution
+    latency: Distribution
+    error_rate: float
+
+    @classmethod
+    def from_env(cls, prefix: str, step_delay: str, latency: str = "fixed:0") -> "Behaviour":
+        return cls(
+            step_delay=Distribution.parse(os.getenv(f"{prefix}_STEP_DELAY", default=step_delay)),
+            latency=Distribution.parse(os.getenv(f"{prefix}_LATENCY", default=latency)),
+            error_rate=float(os.getenv(f"{prefix}_ERROR_RATE", default="0")),
+        )
+
+    def install(self, app: FastAPI):
+        """Add the response latency and errors to all API endpoints."""
+
+        @app.middleware("http")
+        async def degrade(request: Request, call_next):
+            if request.url.path.startswith("/mock/"):
+                return await call_next(request)
+
+            if latency := self.latency.sample():
+                await asyncio.sleep(latency)
+
+            if self.error_rate and random.random() < self.error_rate:
+                return JSONResponse({"error": "Service unavailable"}, status_code=503)
+
+            return await call_next(request)
@@ -0,0 +1,236 @@
+"""
+Provider mock engine: orders storage, status ticker and webhooks delivery.
+
+Orders are advanced by a single ticker instead of a coroutine per order:
+
+    POST /api/orders -> store + plan [(delay, status), ...] -> schedule (heap by due time)
+    ticker (every <PREFIX>_TICK seconds) -> pop due orders -> next status -> webhook queue
+    webhook sender -> batches of <PREFIX>_WEBHOOK_BATCH_SIZE over one pooled httpx client
+
+Memory is bounded: finished orders are kept for <PREFIX>_RETENTION seconds,
+and the oldest orders are evicted above <PREFIX>_MAX_ORDERS.
+
+    GET /mock/stats - ticker lag and webhook counters. If the lag grows,
+                      the mock (not the API) is the bottleneck of the load test.
+
+Logs level is set with MOCK_LOG_LEVEL (status changes are logged on DEBUG).
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+import httpx
+from fastapi import FastAPI
+
+from .behaviour import Behaviour
+
+logging.basicConfig(
+    level=os.getenv("MOCK_LOG_LEVEL", default="INFO"),
+    format="%(asctime)s %(name)s %(levelname)s %(message)s",
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # a line per webhook otherwise
+
+
+@dataclass
+class Step:
+    delay: float
+    status: str | None = None  # None - keep the status (e.g. location update)
+    notify: bool = False
+
+
+@dataclass
+class MockOrder:
+    id: str
+    status: str
+    plan: deque[Step]
+    data: dict = field(default_factory=dict)
+    finished_at: float | None = None
+
+    def payload(self) -> dict:
+        return {"id": self.id, "status": self.status, **self.data}
+
+
+class Store:
+    """Orders by id, in creation order."""
+
+    def __init__(self, max_size: int, retention: float):
+        self.max_size = max_size
+        self.retention = retention
+        self.orders: OrderedDict[str, MockOrder] = OrderedDict()
+        self.finished: deque[tuple[float, str]] = deque()  # (finished at, id), finishing order
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def get(self, order_id: str) -> MockOrder | None:
+        return self.orders.get(order_id)
+
+    def add(self, order: MockOrder):
+        self.orders[order.id] = order
+        while len(self.orders) > self.max_size:
+            self.orders.popitem(last=False)
+            self.evicted += 1
+
+    def finish(self, order: MockOrder, now: float):
+        order.finished_at = now
+        self.finished.append((now, order.id))
+
+    def evict_finished(self, now: float):
+        while self.finished and self.finished[0][0] + self.retention <= now:
+            _, order_id = self.finished.popleft()
+            if self.orders.pop(order_id, None) is not None:
+                self.evicted += 1
+
+
+class WebhookSender:
+    """Deliver webhooks in concurrent batches over one connection pool."""
+
+    def __init__(self, url: str, batch_size: int, concurrency: int, queue_size: int, logger: logging.Logger):
+        self.url = url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=queue_size)
+        self.logger = logger
+        self.client: httpx.AsyncClient | None = None
+        self.stats = {"sent": 0, "failed": 0, "dropped": 0}
+
+    def enqueue(self, data: dict):
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # the ticker must never wait for the API
+            self.stats["dropped"] += 1
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=10) as self.client:
+            while True:
+                batch = [await self.queue.get()]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                await asyncio.gather(*(self._send(data) for data in batch))
+
+    async def _send(self, data: dict):
+        try:
+            response = await self.client.post(self.url, data=data)
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            self.stats["failed"] += 1
+            self.logger.warning("Webhook %s is not delivered: %r", data, error)
+        else:
+            self.stats["sent"] += 1
+
+
+class ProviderMock:
+
+    def __init__(self, name: str, step_delay: str, webhook_url: str | None = None):
+        prefix = name.upper()
+
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self.behaviour = Behaviour.from_env(prefix, step_delay=step_delay)
+        self.tick = float(os.getenv(f"{prefix}_TICK", default="0.1"))
+        self.store = Store(
+            max_size=int(os.getenv(f"{prefix}_MAX_ORDERS", default="100000")),
+            retention=float(os.getenv(f"{prefix}_RETENTION", default="600")),
+        )
+        self.webhooks: WebhookSender | None = None
+        if webhook_url:
+            self.webhooks = WebhookSender(
+                webhook_url,
+                batch_size=int(os.getenv(f"{prefix}_WEBHOOK_BATCH_SIZE", default="100")),
+                concurrency=int(os.getenv(f"{prefix}_WEBHOOK_CONCURRENCY", default="50")),
+                queue_size=int(os.getenv(f"{prefix}_WEBHOOK_QUEUE_SIZE", default="100000")),
+                logger=self.logger,
+            )
+
+        self.schedule: list[tuple[float, str]] = []  # heap of (due time, order id)
+        self.max_lag = 0.0
+
+    def step_delay(self) -> float:
+        return self.behaviour.step_delay.sample()
+
+    def create(self, plan: list[Step], **data) -> MockOrder:
+        order = MockOrder(id=str(uuid.uuid4()), status="not started", plan=deque(plan), data=data)
+        self.store.add(order)
+        self._schedule(order, time.monotonic())
+
+        return order
+
+    def _schedule(self, order: MockOrder, now: float):
+        if order.plan:
+            heapq.heappush(self.schedule, (now + order.plan[0].delay, order.id))
+        else:
+            self.store.finish(order, now)
+
+    def _advance(self, order: MockOrder, now: float):
+        step = order.plan.popleft()
+
+        if step.status is not None and step.status != order.status:
+            order.status = step.status
+            self.logger.debug("[%s] -> %s", order.id, order.status)
+        if "location" in order.data:
+            order.data["location"] = (random.random(), random.random())
+        if step.notify and self.webhooks is not None:
+            self.webhooks.enqueue(self.notification(order))
+
+        self._schedule(order, now)
+
+    def notification(self, order: MockOrder) -> dict:
+        data = {"id": order.id, "status": order.status}
+        if "location" in order.data:
+            data["location"] = list(order.data["location"])
+        return data
+
+    async def run_ticker(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+
+            while self.schedule and self.schedule[0][0] <= now:
+                due, order_id = heapq.heappop(self.schedule)
+                order = self.store.get(order_id)
+                if order is None:  # evicted
+                    continue
+                self.max_lag = max(self.max_lag, now - due)
+                self._advance(order, now)
+
+            self.store.evict_finished(now)
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI):
+        tasks = [asyncio.create_task(self.run_ticker())]
+        if self.webhooks is not None:
+            tasks.append(asyncio.create_task(self.webhooks.run()))
+
+        yield
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "orders": len(self.store),
+            "evicted": self.store.evicted,
+            "scheduled": len(self.schedule),
+            "max_tick_lag": self.max_lag,
+            "webhooks": {
+                **self.webhooks.stats,
+                "pending": self.webhooks.queue.qsize(),
+            } if self.webhooks is not None else None,
+        }
+
+    def install(self, app: FastAPI):
+        self.behaviour.install(app)
+        app.add_api_route("/mock/stats", self.stats, methods=["GET"])
@@ -1,20 +1,18 @@
-import asyncio
 import os
-import random
-import time
-import uuid
 from typing import Literal
 
-import httpx
-from fastapi import BackgroundTasks, FastAPI
+from fastapi import FastAPI
 from pydantic import BaseModel
 
+from .engine import ProviderMock, Step
+
 OrderStatus = Literal["not started", "cooking", "cooked", "finished"]
-STORAGE: dict[str, OrderStatus] = {}
+ORDER_STATUSES: tuple[OrderStatus, ...] = ("cooking", "cooked", "finished")
 CATERING_API_WEBHOOK_URL = f"http://{os.getenv("API_HOST", default="localhost")}:8000/webhooks/kfc/5834eb6c-63b9-4018-b6d3-04e170278ec2/"  # TODO: change host to api
 
-
-app = FastAPI(title="KFC API")
+MOCK = ProviderMock("kfc", step_delay="uniform:4:6", webhook_url=CATERING_API_WEBHOOK_URL)
+app = FastAPI(title="KFC API", lifespan=MOCK.lifespan)
+MOCK.install(app)
 
 
 class OrderItem(BaseModel):
@@ -26,35 +24,17 @@ class OrderRequestBody(BaseModel):
     order: list[OrderItem]
 
 
-async def update_order_status(order_id: str):
-    ORDER_STATUSES: tuple[OrderStatus, ...] = ("cooking", "cooked", "finished")
-    for status in ORDER_STATUSES:
-        await asyncio.sleep(random.randint(4, 6))
-        STORAGE[order_id] = status
-        print(f"KFC: [{order_id}] --> {status}")
-
-        if status == "finished":
-            async with httpx.AsyncClient() as client:
-                try:
-                    await client.post(
-                        CATERING_API_WEBHOOK_URL,
-                        data={"id": order_id, "status": status},
-                    )
-                except httpx.ConnectError:
-                    print("API connection failed")
-                else:
-                    print(f"KFC: {CATERING_API_WEBHOOK_URL} notified about {status}")
-
-
 @app.post("/api/orders")
-async def make_order(body: OrderRequestBody, background_tasks: BackgroundTasks):
-    order_id = str(uuid.uuid4())
-    STORAGE[order_id] = "not started"
-    background_tasks.add_task(update_order_status, order_id)
+async def make_order(body: OrderRequestBody):
+    # only the final status is notified
+    order = MOCK.create(
+        [Step(MOCK.step_delay(), status, notify=status == "finished") for status in ORDER_STATUSES]
+    )
 
-    return {"id": order_id, "status": "not started"}
+    return {"id": order.id, "status": order.status}
 
 
 @app.get("/api/orders/{order_id}")
 async def get_order(order_id: str):
-    return STORAGE.get(order_id, {"error": "No such order"})
\ No newline at end of file
+    order = MOCK.store.get(order_id)
+    return order.status if order else {"error": "No such order"}
@@ -1,15 +1,16 @@
-import asyncio
 import random
-import uuid
 
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI
 from pydantic import BaseModel, Field
 
+from .engine import ProviderMock, Step
+
 
 ORDER_STATUSES = ("not started", "delivery", "delivered")
-STORAGE: dict[str, dict] = {}
 
-app = FastAPI()
+MOCK = ProviderMock("uklon", step_delay="uniform:1:2")
+app = FastAPI(lifespan=MOCK.lifespan)
+MOCK.install(app)
 
 
 class OrderRequestBody(BaseModel):
@@ -17,48 +18,30 @@ class OrderRequestBody(BaseModel):
     comments: list[str] = Field(min_length=1)
 
 
-async def delivery(order_id: str):
-    for _ in range(5):
-        STORAGE[order_id]["location"] = (random.random(), random.random())
-        #await asyncio.sleep(1)
-
-    for address in STORAGE[order_id]["addresses"]:
-        await asyncio.sleep(1)
-        for _ in range(5):
-            STORAGE[order_id]["location"] = (random.random(), random.random())
-            await asyncio.sleep(0.5)
-
-        print(f"🏁 Delivered to {address}")
+def delivery_plan(addresses: list[str]) -> list[Step]:
+    plan = [Step(MOCK.step_delay(), "delivery")]
 
+    for _ in addresses:
+        plan.append(Step(1))
+        plan.extend(Step(0.5) for _ in range(5))  # location changes on the way
 
-async def update_order_status(order_id):
-    for status in ORDER_STATUSES[1:]:
-        STORAGE[order_id]["location"] = (random.random(), random.random())
-        await asyncio.sleep(random.randint(1, 2))
+    plan.append(Step(MOCK.step_delay(), "delivered"))
 
-        if status == "delivery":
-            await delivery(order_id)
-
-        STORAGE[order_id]["status"] = status
-        print(f"UKLON: [{order_id}] -> {status}")
+    return plan
 
 
 @app.post("/drivers/orders")
-async def make_order(body: OrderRequestBody, background_tasks: BackgroundTasks):
-    print(body)
-
-    order_id = str(uuid.uuid4())
-    STORAGE[order_id] = {
-        "id": order_id,
-        "status": "not started",
-        "addresses": body.addresses,
-        "comments": body.comments,
-        "location": (random.random(), random.random())
-    }
-    background_tasks.add_task(update_order_status, order_id)
+async def make_order(body: OrderRequestBody):
+    order = MOCK.create(
+        delivery_plan(body.addresses),
+        addresses=body.addresses,
+        comments=body.comments,
+        location=(random.random(), random.random()),
+    )
 
-    return STORAGE.get(order_id, {"error": "No such order"})
+    return order.payload()
 
 @app.get("/drivers/orders/{order_id}")
 async def get_order(order_id: str):
-    return STORAGE.get(order_id, {"error": "No such order"})
+    order = MOCK.store.get(order_id)
+    return order.payload() if order else {"error": "No such order"}
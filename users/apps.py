@@ -1,6 +1,31 @@
 from django.apps import AppConfig
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 
 
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from .authentication import invalidate_user
+        from .models import User
+        from .services import ActivationService
+
+        def on_user_changed(sender, instance: User, created: bool = False, update_fields=None, **kwargs):
+            if created:  # new users are not cached yet
+                return
+            if update_fields and set(update_fields) <= {"password", "last_login"}:  # not cached fields
+                return
+            # post_save is sent before the commit: a request in between would cache the old row again
+            user_id = instance.pk  # it is None after delete() is finished
+            transaction.on_commit(lambda: invalidate_user(user_id))
+
+        def on_user_deleted(sender, instance: User, **kwargs):
+            # links of the sent activation emails (and the buffered ones, see ActivationMailer.flush) stop working
+            user_id = instance.pk
+            transaction.on_commit(lambda: ActivationService().revoke_activation_keys(user_id=user_id), robust=True)
+
+        post_save.connect(on_user_changed, sender=User, weak=False, dispatch_uid="users.invalidate_cached_user")
+        post_delete.connect(on_user_changed, sender=User, weak=False, dispatch_uid="users.invalidate_cached_user_on_delete")
+        post_delete.connect(on_user_deleted, sender=User, weak=False, dispatch_uid="users.revoke_activation_keys")
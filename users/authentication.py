@@ -0,0 +1,98 @@
+"""
+JWT authentication without the users query per request.
+
+    POST /auth/token/  -> access token with user_id, role, is_active, token_version claims
+    GET  /food/orders/ -> User is built from the `users` cache namespace (USER_CACHE_TIME)
+
+The cache is keyed by user id; the token is accepted only if its `token_version`
+claim matches the cached user (set_password increments the version).
+Cached users are dropped on every User save/delete (see UsersConfig.ready),
+so role and is_active changes are applied to the next request.
+"""
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from shared.cache import CacheService
+
+from .models import User
+
+# everything IsAdmin, UserSerializer and permissions need; never the password hash
+CACHED_FIELDS = (
+    "id",
+    "email",
+    "phone_number",
+    "first_name",
+    "last_name",
+    "role",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "token_version",
+)
+
+
+def cache_user(user: User):
+    payload = {field: getattr(user, field) for field in CACHED_FIELDS}
+    CacheService().set(namespace="users", key=str(user.pk), value=payload, ttl=settings.USER_CACHE_TIME)
+
+
+def invalidate_user(user_id: int):
+    CacheService().delete(namespace="users", key=str(user_id))
+
+
+def get_cached_user(user_id: int) -> User | None:
+    payload: dict | None = CacheService().get(namespace="users", key=str(user_id))
+    if payload is None:
+        return None
+
+    # instance of the existing row (not `adding`), but without password and last_login:
+    # it is for reading only, don't save() it
+    user = User(**payload)
+    user._state.adding = False
+    return user
+
+
+class TokenObtainSerializer(TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user: User) -> Token:
+        token = super().get_token(user)
+        token["role"] = user.role
+        token["is_active"] = user.is_active
+        token["token_version"] = user.token_version
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token: Token) -> User:
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as error:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from error
+
+        if validated_token.get("is_active") is False:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        user = get_cached_user(user_id)
+        if user is None:
+            try:
+                user = User.objects.get(id=user_id)
+            except User.DoesNotExist as error:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from error
+            cache_user(user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        # tokens issued before this claim was added have no version: they live until expiration
+        if validated_token.get("token_version", user.token_version) != user.token_version:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,53 @@
+"""
+Password hashing.
+
+    DJANGO_PASSWORD_HASHER=argon2              # pbkdf2 (default) | argon2 | bcrypt | scrypt
+    DJANGO_PASSWORD_PBKDF2_ITERATIONS=600000
+    DJANGO_PASSWORD_HASHING_WORKERS=2
+
+Hashing is slow by design, so registrations hash in a bounded thread pool:
+a burst of sign-ups occupies at most PASSWORD_HASHING_WORKERS cores and the
+rest of the requests of the web worker proceed. OpenSSL PBKDF2/scrypt, argon2-cffi
+and bcrypt release the GIL, so threads are enough.
+
+Hashes made by the other hashers stay valid and are upgraded to the selected one
+on the next login. argon2 and bcrypt require argon2-cffi / bcrypt packages.
+
+Compare hashers on the target machine:
+    DJANGO_PASSWORD_HASHER=argon2 python -m benchmarks --filter users.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import make_password
+
+from shared.metrics import Histogram
+
+PASSWORD_HASH_WAIT = Histogram("password_hash_wait_seconds", "Time a password waited for the hashing pool")
+PASSWORD_HASH_DURATION = Histogram("password_hash_seconds", "Password hashing time", labels=("algorithm",))
+
+_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix="password-hashing")
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Django PBKDF2 with DJANGO_PASSWORD_PBKDF2_ITERATIONS (hashes with other iterations are upgraded on login)."""
+
+    iterations = settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+def _hash(raw_password: str, submitted_at: float) -> str:
+    started = time.perf_counter()
+    PASSWORD_HASH_WAIT.observe(started - submitted_at)
+
+    password = make_password(raw_password)
+    PASSWORD_HASH_DURATION.observe(time.perf_counter() - started, algorithm=settings.PASSWORD_HASHER)
+    return password
+
+
+def hash_password(raw_password: str) -> str:
+    """make_password in the hashing pool; blocks the caller until the hash is ready."""
+
+    return _pool.submit(_hash, raw_password, time.perf_counter()).result()
@@ -1,10 +1,12 @@
 from enum import StrEnum, auto
 
 from django.db import models
-from django.contrib.auth.hashers import make_password
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
 
+from .hashers import hash_password
+
 
 class Role(StrEnum):
     ADMIN = auto()
@@ -27,7 +29,7 @@ class UserManager(BaseUserManager):
     def create_user(self, email: str, password:str, **extra_fields):
         """Create and save USER with passed parameters"""
         email = self.normalize_email(email)
-        password = make_password(password)  # hashing password
+        password = hash_password(password)  # hashing password (the only one per registration)
 
         extra_fields["is_active"] = False
         extra_fields["is_staff"] = False
@@ -43,7 +45,7 @@ class UserManager(BaseUserManager):
     def create_superuser(self, email: str, password:str, **extra_fields):
         """Create and save SUPERUSER with passed parameters"""
         email = self.normalize_email(email)
-        password = make_password(password)  # hashing password
+        password = hash_password(password)  # hashing password
 
         extra_fields["is_staff"] = True
         extra_fields["is_superuser"] = True
@@ -74,6 +76,22 @@ class User(AbstractBaseUser, PermissionsMixin):
     # choices - is to create dropdown
     role = models.CharField(max_length=50, default=Role.CUSTOMER, choices=Role.choises())
 
+    # part of JWT claims: tokens issued before the password change are rejected
+    token_version = models.PositiveIntegerField(default=0)
+
     EMAIL_FIELD = "email"
     USERNAME_FIELD = "email"  # TODO: why email?
     REQUIRED_FIELDS = []  # TODO: why it is empty?
+
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        self.token_version += 1
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            # rehash with the new hasher/iterations is not a password change: tokens stay valid
+            super(User, self).set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return check_password(raw_password, self.password, setter)
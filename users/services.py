@@ -1,12 +1,123 @@
+"""
+Activation emails are buffered and sent in batches:
+
+    send_user_activation_email (on commit) -> RPUSH mail:activation {email, activation_key}
+    flush_activation_emails (beat)         -> LMOVE batch to mail:activation:processing
+                                              -> send over one SMTP connection -> LPOP sent ones
+
+Emails are removed from the processing list only after they are sent, so the ones
+of a flush that died in the middle of the batch are returned to the buffer by the next flush
+(one flush runs at a time). Messages failed with transient SMTP errors (4xx, disconnects)
+are retried with backoff and then returned to the buffer for the next flush.
+
+The key waits for its email ACTIVATION_EMAIL_MAX_DELAY seconds; when the email is sent
+the key expiration is set to ACTIVATION_EXPIRATION_TIME, so the link works that long after the send.
+"""
+
+from functools import cache, partial
+import smtplib
 import uuid
 
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db import transaction
+from django.template import Template
+from django.template.loader import get_template
 
 from config import celery_app
 from shared.cache import CacheService
+from shared.metrics import Counter
+from shared.task_metrics import blocked, wait
+from .authentication import invalidate_user
 from .models import User
 
+ACTIVATION_EMAILS = Counter("activation_emails_total", "Activation emails by the sending result", labels=("result",))
+
+
+@cache
+def activation_template() -> Template:
+    return get_template("users/activation_email.txt")
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    # disconnects, timeouts, refused connections (SMTPException is OSError too)
+    return isinstance(error, OSError)
+
+
+class ActivationMailer:
+
+    def __init__(self):
+        self.cache: CacheService = CacheService()
+        self.connection = get_connection(fail_silently=False)
+
+    def buffer(self, email: str, activation_key: str):
+        self.cache.push_items("mail", "activation", {"email": email, "activation_key": activation_key})
+
+    @staticmethod
+    def build_message(email: str, activation_key: str) -> EmailMessage:
+        return EmailMessage(
+            subject="User Activation",
+            body=activation_template().render({"activation_key": activation_key}),
+            from_email="admin@catering.com",
+            to=[email],
+        )
+
+    def flush(self, batch_size: int) -> int:
+        """Send one batch of buffered emails. Return number of emails taken from the buffer."""
+
+        items: list[dict] = self.cache.move_items("mail", "activation", "activation:processing", batch_size)
+
+        for index, item in enumerate(items):
+            # the link expiration starts with the send
+            if not self.cache.expire("activation", item["activation_key"], settings.ACTIVATION_EXPIRATION_TIME):
+                print(f"Activation email to {item['email']} is not sent: the key is expired")
+                ACTIVATION_EMAILS.inc(result="expired")
+            elif not self._send(self.build_message(**item)):
+                # the server is unavailable: keep the rest for the next flush
+                requeued = self.cache.restore_items("mail", "activation:processing", "activation")
+                ACTIVATION_EMAILS.inc(requeued, result="requeued")
+                return index
+
+            self.cache.pop_items("mail", "activation:processing", 1)  # done with the email
+
+        return len(items)
+
+    def recover(self) -> int:
+        """Return emails of a flush that died in the middle of the batch to the buffer."""
+
+        return self.cache.restore_items("mail", "activation:processing", "activation")
+
+    def _send(self, message: EmailMessage) -> bool:
+        """Return False if the message is not sent because of transient errors."""
+
+        for attempt in range(settings.ACTIVATION_EMAIL_RETRIES + 1):
+            try:
+                with blocked("io"):
+                    self.connection.open()  # no-op if the connection is already open
+                    self.connection.send_messages([message])
+            except Exception as error:
+                self.connection.close()  # broken connection is not reused
+
+                if not is_transient(error):
+                    print(f"❌ Activation email to {message.to[0]} is not sent: {error}")
+                    ACTIVATION_EMAILS.inc(result="failed")
+                    return True
+                if attempt < settings.ACTIVATION_EMAIL_RETRIES:
+                    wait(settings.ACTIVATION_EMAIL_RETRY_DELAY * 2**attempt)
+            else:
+                ACTIVATION_EMAILS.inc(result="sent")
+                return True
+
+        return False
+
+    def close(self):
+        self.connection.close()
+
+
 class ActivationService:
 
     def __init__(self, email: str | None = None):
@@ -22,42 +133,95 @@ class ActivationService:
     def save_activation_information(self, user_id: int, activation_key: str):
         """Save activation data to the cache
         1. Connect to the Cache Service
-        2. Save structure to the Cache
-        {
-            "fevge-g25tg-42tg5455g-425g4g": {
-                "user_id": 3
-            }
-        }
+        2. Save the key and add it to the user index
+            activation:fevge-g25tg-42tg5455g-425g4g -> 3
+            activation:users:3 -> {activation:fevge-g25tg-42tg5455g-425g4g}
         3. Return None
         """
-        payload = {
-            "user_id": user_id
-        }
-        self.cache.set(namespace="activation", key=str(activation_key), value=payload, ttl=settings.ACTIVATION_EXPIRATION_TIME)
+        self.cache.set_activation_key(
+            activation_key=str(activation_key), user_id=user_id, ttl=settings.ACTIVATION_KEY_TIME
+        )
         return None
 
-    @staticmethod
-    @celery_app.task(queue="low_priority")
-    def send_user_activation_email(email, activation_key: str):
-        if email is None:
+    def get_or_create_activation_key(self, user_id: int) -> str:
+        """Return the outstanding activation key of the user (its expiration is prolonged) or a new one."""
+
+        activation_key = self.cache.prolong_activation_key(user_id=user_id, ttl=settings.ACTIVATION_KEY_TIME)
+        if activation_key is not None:
+            return activation_key
+
+        activation_key = str(self.create_activation_key())
+        self.save_activation_information(user_id=user_id, activation_key=activation_key)
+        return activation_key
+
+    def revoke_activation_keys(self, user_id: int) -> int:
+        """Make all sent activation links of the user invalid. Return number of revoked keys."""
+        return self.cache.revoke_activation_keys(user_id=user_id)
+
+    def resend_retry_after(self, ip: str) -> float:
+        """Count the resend for the email and the client IP. Return seconds to wait, 0 - allowed."""
+
+        return max(
+            self.cache.hit_sliding_window(
+                namespace="resend_activation",
+                key=f"ip:{ip}",
+                limit=settings.RESEND_ACTIVATION_IP_LIMIT,
+                window=settings.RESEND_ACTIVATION_WINDOW,
+            ),
+            self.cache.hit_sliding_window(
+                namespace="resend_activation",
+                key=f"email:{self.email.lower()}",
+                limit=settings.RESEND_ACTIVATION_EMAIL_LIMIT,
+                window=settings.RESEND_ACTIVATION_WINDOW,
+            ),
+        )
+
+    def send_user_activation_email(self, activation_key: str):
+        if self.email is None:
             raise ValueError("No email specified for user activation process")
 
-        # SMTP Client Send Email Request
-        activation_link = f"https://frontend.catering.com/activation/{activation_key}"
-        send_mail(subject="User Activation",
-                  message=f"Please activate your account: {activation_link}",
-                  from_email="admin@catering.com",
-                  recipient_list=[email])
+        # after the commit: the user and the key exist (robust: the user can ask to resend it)
+        transaction.on_commit(partial(self._buffer_activation_email, str(activation_key)), robust=True)
+
+    def _buffer_activation_email(self, activation_key: str):
+        # sent by the next flush_activation_emails together with others
+        ActivationMailer().buffer(self.email, activation_key)
+
+        if celery_app.conf.task_always_eager:  # no beat
+            flush_activation_emails()
 
     def activate_user(self, activation_key: str) -> None:
-        user_cache_payload: dict | None = self.cache.get(namespace="activation", key=activation_key)
+        # one atomic cache call: the key can't be used twice, other keys of the user are deleted too
+        user_id: int | None = self.cache.pop_activation_key(activation_key=str(activation_key))
 
-        if user_cache_payload is None:
+        if user_id is None:
             raise ValueError("No payload in cache")
 
-        user = User.objects.get(id=user_cache_payload["user_id"])
-        user.is_active = True
-        user.save()
-        # OR User.objects.filter(id=user...).update(is_active=True)
-        self.cache.delete(namespace="activation", key=activation_key)
+        User.objects.filter(id=user_id).update(is_active=True)
+        invalidate_user(user_id)  # update() doesn't send post_save
+
+
+@celery_app.task(queue="low_priority")
+def flush_activation_emails():
+    mailer = ActivationMailer()
+    total = 0
+
+    # one flush at a time: the processing list belongs to it
+    if not mailer.cache.add("mail", "activation:flush", {}, ttl=settings.ACTIVATION_EMAIL_FLUSH_TIMEOUT):
+        return
+
+    try:
+        if recovered := mailer.recover():
+            print(f"{recovered} activation emails of the interrupted flush are returned to the buffer")
+
+        while sent := mailer.flush(batch_size=settings.ACTIVATION_EMAIL_BATCH_SIZE):
+            mailer.cache.expire("mail", "activation:flush", settings.ACTIVATION_EMAIL_FLUSH_TIMEOUT)
+            total += sent
+            if sent < settings.ACTIVATION_EMAIL_BATCH_SIZE:
+                break
+    finally:
+        mailer.close()
+        mailer.cache.delete("mail", "activation:flush")
 
+    if total:
+        print(f"{total} activation emails are processed")
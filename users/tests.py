@@ -1,3 +1,131 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
+import smtplib
 
-# Create your tests here.
+import redis
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+
+from shared.cache import CacheService
+
+from .models import User
+from .services import ActivationMailer, ActivationService, flush_activation_emails
+
+
+def redis_available() -> bool:
+    try:
+        CacheService().connection.ping()
+    except redis.RedisError:
+        return False
+    return True
+
+
+@skipUnless(redis_available(), "Redis is not available")
+class ActivationMailerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = CacheService()
+        for key in ("activation", "activation:processing", "activation:flush"):
+            self.cache.delete("mail", key)
+            self.addCleanup(self.cache.delete, "mail", key)
+
+        self.activation_key = ActivationService().get_or_create_activation_key(user_id=10**9)
+        self.addCleanup(ActivationService().revoke_activation_keys, user_id=10**9)
+        mail.outbox = []
+
+    def ttl(self) -> int:
+        return self.cache.connection.ttl(f"activation:{self.activation_key}")
+
+    def test_link_expiration_starts_with_the_send(self):
+        self.assertGreater(self.ttl(), settings.ACTIVATION_EXPIRATION_TIME)
+
+        ActivationMailer().buffer("john@catering.com", self.activation_key)
+        flush_activation_emails()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertLessEqual(self.ttl(), settings.ACTIVATION_EXPIRATION_TIME)
+
+    def test_emails_of_interrupted_flush_are_sent_by_the_next_one(self):
+        mailer = ActivationMailer()
+        mailer.buffer("john@catering.com", self.activation_key)
+        # the worker died after taking the batch
+        self.cache.move_items("mail", "activation", "activation:processing", 10)
+
+        flush_activation_emails()
+
+        self.assertEqual([message.to for message in mail.outbox], [["john@catering.com"]])
+        self.assertEqual(self.cache.connection.llen("mail:activation:processing"), 0)
+
+    def test_unsent_emails_are_returned_to_the_buffer(self):
+        mailer = ActivationMailer()
+        mailer.buffer("john@catering.com", self.activation_key)
+        mailer.buffer("jane@catering.com", self.activation_key)
+
+        with (
+            mock.patch.object(mailer.connection, "send_messages", side_effect=smtplib.SMTPServerDisconnected),
+            mock.patch("users.services.wait"),
+        ):
+            self.assertEqual(mailer.flush(batch_size=10), 0)
+
+        self.assertEqual(
+            [item["email"] for item in self.cache.pop_items("mail", "activation", 10)],
+            ["john@catering.com", "jane@catering.com"],
+        )
+        self.assertEqual(self.cache.connection.llen("mail:activation:processing"), 0)
+
+
+@mock.patch("users.authentication.CacheService")
+class CachedUserInvalidationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="john@catering.com", phone_number="0000000001")
+
+    def test_user_is_invalidated_on_commit(self, cache_service):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "John"
+            self.user.save()
+            cache_service.return_value.delete.assert_not_called()
+
+        cache_service.return_value.delete.assert_called_once_with(namespace="users", key=str(self.user.pk))
+
+    def test_deleted_user_is_invalidated(self, cache_service):
+        user_id = self.user.pk
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        cache_service.return_value.delete.assert_called_once_with(namespace="users", key=str(user_id))
+
+
+@skipUnless(redis_available(), "Redis is not available")
+class ActivationKeysRevocationTests(TestCase):
+
+    def test_keys_of_deleted_user_are_revoked(self):
+        user = User.objects.create(email="john@catering.com", phone_number="0000000001")
+        activation_key = ActivationService().get_or_create_activation_key(user_id=user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+
+        self.assertIsNone(CacheService().pop_activation_key(activation_key))
+
+
+@mock.patch("users.services.ActivationMailer")
+class ActivationEmailBufferingTests(TestCase):
+
+    def test_email_is_buffered_on_commit(self, mailer):
+        with self.captureOnCommitCallbacks(execute=True):
+            ActivationService(email="john@catering.com").send_user_activation_email("key")
+            mailer.return_value.buffer.assert_not_called()
+
+        mailer.return_value.buffer.assert_called_once_with("john@catering.com", "key")
+
+    def test_email_is_not_buffered_on_rollback(self, mailer):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                ActivationService(email="john@catering.com").send_user_activation_email("key")
+                raise RuntimeError
+
+        self.assertEqual(callbacks, [])
+        mailer.return_value.buffer.assert_not_called()
@@ -3,14 +3,15 @@ from typing import Any
 from rest_framework import  viewsets, routers, permissions, serializers
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import Throttled, ValidationError
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.views import TokenObtainPairView
 from django.shortcuts import get_object_or_404
 
-from django.contrib.auth.hashers import make_password
 from django.db import transaction
 
+from .authentication import CachedJWTAuthentication
 from .models import User
 from .services import ActivationService
 
@@ -32,12 +33,9 @@ class UserSerializer(serializers.ModelSerializer):
             "role"
         ]
 
-    def validate(self, attrs: dict[str, Any]):
-        """Change password to its hash to make Token-based authentication available"""
-        attrs["password"] = make_password(attrs["password"])
-        attrs["is_active"] = False
-
-        return super().validate(attrs=attrs)
+    def create(self, validated_data: dict[str, Any]) -> User:
+        """Password is hashed once, by create_user; the user is inactive until activation"""
+        return User.objects.create_user(**validated_data)
 
 class UserActivationSerializer(serializers.Serializer):
     key = serializers.UUIDField()
@@ -47,8 +45,9 @@ class UserResendActivationSerializer(serializers.Serializer):
 
 class UsersAPIViewSet(viewsets.GenericViewSet):
 
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     #permission_classes = [permissions.AllowAny]  # was IsAuthenticate but user creation should be allowed without auth
+    throttle_scope = "registration"  # see THROTTLES
 
     def get_permissions(self):
         #return super().get_permissisons()
@@ -59,6 +58,12 @@ class UsersAPIViewSet(viewsets.GenericViewSet):
         else:
             return [permissions.IsAuthenticated()]
 
+    def get_throttles(self):
+        # registration hashes the password; resend_activation has its own limits
+        if self.action == "create":
+            return super().get_throttles()
+        return []
+
     def list(self, request: Request):
         # instead of this:
         # user = request.user
@@ -74,36 +79,35 @@ class UsersAPIViewSet(viewsets.GenericViewSet):
         return Response(UserSerializer(request.user).data, status=200)
 
 
-    @transaction.atomic
     def create(self, request: Request):
         # to validate data
         serializer = UserSerializer(data=request.data)
         # if not serializer.is_valid():  # generates error in case of any error during serialization
         #     return Response()  # with errors
         serializer.is_valid(raise_exception=True)
-        instance = serializer.save()  # can't be saved before validation (serializer.is_valid())
 
-        email = serializer.instance.email
-        #Activation process
-        activation_service = ActivationService(
-            email=serializer.instance.email
-            # email = getattr(serializer.instance, "email")
-        )
-        activation_key = activation_service.create_activation_key()
+        # only the writes: validation doesn't hold the transaction open
+        with transaction.atomic():
+            serializer.save()  # can't be saved before validation (serializer.is_valid())
+
+            email = serializer.instance.email
+            #Activation process
+            activation_service = ActivationService(email=email)
+            activation_key = activation_service.create_activation_key()
 
-        activation_service.save_activation_information(
-            user_id=serializer.instance.id,
-            activation_key=activation_key
-        )
+            activation_service.save_activation_information(
+                user_id=serializer.instance.id,
+                activation_key=activation_key
+            )
 
-        ActivationService.send_user_activation_email.delay(email, activation_key=activation_key)
+            activation_service.send_user_activation_email(activation_key)
 
         return Response(UserSerializer(serializer.instance).data, status=201)
 
     @action(methods=["POST"], detail=False)
     def activate(self, request: Request) -> Response:
         serializer = UserActivationSerializer(data=request.data)
-        serializer.is_valid()
+        serializer.is_valid(raise_exception=True)
 
         activation_service = ActivationService()
 
@@ -117,26 +121,30 @@ class UsersAPIViewSet(viewsets.GenericViewSet):
     @action(methods=["POST"], detail=False)
     def resend_activation(self, request: Request):
         serializer = UserResendActivationSerializer(data=request.data)
-        serializer.is_valid()
+        serializer.is_valid(raise_exception=True)
 
         email = serializer.validated_data["email"]
-        user_id = get_object_or_404(User, email=email).id
-        is_active = get_object_or_404(User, email=email).is_active
+        activation_service = ActivationService(email=email)
 
-        if is_active:
-            raise ValidationError("User already activated")
+        # before the database: flood is stopped at Redis
+        retry_after = activation_service.resend_retry_after(ip=BaseThrottle().get_ident(request))
+        if retry_after:
+            raise Throttled(wait=retry_after)
 
-        activation_service = ActivationService(email=email)
-        activation_key = activation_service.create_activation_key()
+        user = get_object_or_404(User.objects.values_list("id", "is_active", named=True), email=email)
+
+        if user.is_active:
+            raise ValidationError("User already activated")
 
-        activation_service.save_activation_information(
-            user_id=user_id,
-            activation_key=activation_key
-        )
+        activation_key = activation_service.get_or_create_activation_key(user_id=user.id)
 
-        ActivationService.send_user_activation_email.delay(email, activation_key=activation_key)
+        activation_service.send_user_activation_email(activation_key)
 
         return Response(data=None, status=204)
 
+class TokenObtainView(TokenObtainPairView):
+    throttle_scope = "auth"  # every attempt checks the password hash
+
+
 router = routers.DefaultRouter()
 router.register(r"", UsersAPIViewSet, basename="user")